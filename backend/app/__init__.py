@@ -1,11 +1,33 @@
+import os
+import sys
+
 from flask import Flask
 from flask_cors import CORS
 
+# Detection modules live at the repository root, next to backend/
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
+
+
 def create_app():
     app = Flask(__name__)
     CORS(app)
 
+    # Shared store (e.g. TRAFFIC_STORE=redis://localhost:6379/0) when running several workers
+    from .logic import set_smoothing, set_store
+    from .state_store import create_store
+    set_store(create_store(os.environ.get("TRAFFIC_STORE")))
+    # Signal timing on smoothed counts, e.g. TRAFFIC_SMOOTHING=ewma
+    set_smoothing(os.environ.get("TRAFFIC_SMOOTHING") or None)
+
     from .routes import traffic_bp
     app.register_blueprint(traffic_bp)
 
+    from .detection import detection_bp, get_batcher
+    app.register_blueprint(detection_bp)
+    # Load and warm the detector at startup instead of on the first upload
+    if os.environ.get("DETECTOR_PRELOAD"):
+        get_batcher()
+
     return app
@@ -0,0 +1,162 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import Blueprint, current_app, request, jsonify
+
+from .logic import DEFAULT_INTERSECTION, update_traffic_counts
+from .state_store import DIRECTIONS
+
+detection_bp = Blueprint("detection", __name__)
+
+# Shared detector, created on first use
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+class MicroBatcher:
+    """
+    Runs frames from concurrent requests through one detector in small batches
+
+    Request threads queue their frames and wait; a single worker thread owns
+    the detector, collects whatever arrives within max_wait (up to
+    max_batch frames) and runs it as one forward pass.
+    """
+
+    def __init__(self, detector, max_batch=8, max_wait=0.01):
+        self.detector = detector
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.frames = 0
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def detect(self, frames, lanes, timeout=60):
+        """
+        Detect vehicles in decoded frames, batched with other callers' frames
+
+        Returns:
+            list: Detection results in the detect_vehicles format, one per frame
+        """
+        futures = []
+        for frame, lane in zip(frames, lanes):
+            future = Future()
+            self.requests.put((frame, lane, future))
+            futures.append(future)
+        return [future.result(timeout=timeout) for future in futures]
+
+    def _run(self):
+        while True:
+            batch = [self.requests.get()]
+
+            # Wait briefly for more frames to share the forward pass
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.requests.get(timeout=remaining) if remaining > 0
+                                 else self.requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            frames, lanes, futures = zip(*batch)
+            try:
+                results = self.detector.detect_frames(list(frames), list(lanes))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.frames += len(batch)
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+
+def get_batcher():
+    """Load and warm the shared detector on first use"""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            # Heavy imports are only paid for once detection is actually used
+            from pipeline_metrics import default_metrics
+            from vehicle_detector import VehicleDetector
+
+            detector = VehicleDetector(model_size=os.environ.get("DETECTOR_MODEL", "n"),
+                                       confidence=float(os.environ.get("DETECTOR_CONF", 0.25)),
+                                       metrics=default_metrics)
+            detector.warmup()
+            _batcher = MicroBatcher(detector,
+                                    max_batch=int(os.environ.get("DETECTOR_MAX_BATCH", 8)),
+                                    max_wait=float(os.environ.get("DETECTOR_MAX_WAIT", 0.01)))
+        return _batcher
+
+
+def _read_lane_images():
+    """
+    Collect the uploaded lane images as {direction: JPEG bytes}
+
+    Multipart uploads name each file part after its direction (or use the
+    file name, e.g. north.jpg). A raw image body is one lane, named by the
+    direction query parameter.
+    """
+    if request.files:
+        images = {}
+        for field, upload in request.files.items(multi=True):
+            name = field if field.lower() in DIRECTIONS else os.path.splitext(upload.filename or "")[0]
+            images[name.lower()] = upload.read()
+        return images
+
+    direction = request.args.get("direction")
+    if not direction:
+        raise ValueError("Raw image uploads need a direction query parameter")
+    return {direction.lower(): request.get_data()}
+
+
+@detection_bp.route("/detect_counts", methods=["POST"])
+def detect_counts():
+    import cv2
+    import numpy as np
+
+    try:
+        images = _read_lane_images()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    unknown = [lane for lane in images if lane not in DIRECTIONS]
+    if not images or unknown:
+        return jsonify({"status": "error",
+                        "message": f"Expected images for {', '.join(DIRECTIONS)}, got {', '.join(images) or 'none'}"}), 400
+
+    # Decode in memory on the request thread
+    frames = {}
+    for lane, data in images.items():
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return jsonify({"status": "error", "message": f"Could not decode the {lane} image"}), 400
+        frames[lane] = frame
+
+    intersection = request.args.get("intersection", DEFAULT_INTERSECTION)
+    try:
+        # Lane keys keep motion gates and ROIs separate per intersection
+        results = get_batcher().detect(list(frames.values()), [f"{intersection}/{lane}" for lane in frames])
+    except Exception as e:
+        current_app.logger.exception("Detection failed")
+        return jsonify({"status": "error", "message": f"Error: {str(e)}"}), 500
+
+    vehicle_counts = {lane: result["total_count"] for lane, result in zip(frames, results)}
+    vehicle_types = {lane: result["vehicle_types"] for lane, result in zip(frames, results)}
+    success, message = update_traffic_counts({**vehicle_counts, "vehicle_types": vehicle_types}, intersection)
+
+    return jsonify({
+        "status": "success" if success else "error",
+        "message": message,
+        "intersection": intersection,
+        "vehicle_counts": vehicle_counts,
+        "vehicle_types": vehicle_types
+    })
@@ -0,0 +1,216 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from .state_store import DIRECTIONS
+
+# Vehicle types stored next to each total count (-1 when a sample didn't report them)
+VEHICLE_TYPES = ("car", "motorcycle", "bus", "truck")
+
+# Smoothing methods calculate_signal_times can use instead of the latest sample
+SMOOTHING_METHODS = ("mean", "ewma", "max")
+
+# Largest count a sample can hold (counts are stored as int32)
+MAX_COUNT = int(np.iinfo(np.int32).max)
+
+
+class LaneHistory:
+    """
+    Fixed-size ring buffer of timestamped counts for one lane
+
+    Rolling means and maxima over each window, and the EWMA, are updated
+    incrementally on every append (O(1), amortized for the maxima), so
+    reading them never scans the buffer.
+    """
+
+    def __init__(self, capacity=1024, windows=(5, 20), alpha=0.3):
+        """
+        Args:
+            capacity (int): Samples kept; older ones are overwritten
+            windows (tuple): Rolling window lengths in samples (each at most capacity)
+            alpha (float): EWMA weight of the newest sample
+        """
+        if max(windows) > capacity:
+            raise ValueError("Rolling windows can't be longer than the buffer")
+
+        self.capacity = capacity
+        self.windows = tuple(windows)
+        # Window used for smoothed mean/max
+        self.longest = self.windows.index(max(self.windows))
+        self.alpha = alpha
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        # Column 0 is the total, then one column per vehicle type
+        self.counts = np.zeros((capacity, 1 + len(VEHICLE_TYPES)), dtype=np.int32)
+        self.appended = 0
+
+        self.sums = [0] * len(self.windows)
+        # Monotonic (sequence, count) deques whose heads are the window maxima
+        self.maxima = [deque() for _ in self.windows]
+        self.ewma = None
+        self.lock = threading.Lock()
+
+    def append(self, total, vehicle_types=None, timestamp=None):
+        """
+        Add one sample, overwriting the oldest once the buffer is full
+
+        Raises:
+            ValueError: If a count is negative or larger than MAX_COUNT (nothing is stored)
+        """
+        # Convert and check everything before any rolling state changes
+        total = int(total)
+        row = [total] + [int(vehicle_types.get(t, 0)) if vehicle_types else -1 for t in VEHICLE_TYPES]
+        if total < 0 or any(count > MAX_COUNT for count in row) or (vehicle_types and min(row) < 0):
+            raise ValueError(f"Counts must be between 0 and {MAX_COUNT}")
+        timestamp = time.time() if timestamp is None else float(timestamp)
+
+        with self.lock:
+            seq = self.appended
+            slot = seq % self.capacity
+
+            for i, window in enumerate(self.windows):
+                # Sample leaving the window (read before its slot may be overwritten)
+                if seq >= window:
+                    self.sums[i] -= int(self.counts[(seq - window) % self.capacity, 0])
+                self.sums[i] += total
+
+                maxima = self.maxima[i]
+                while maxima and maxima[-1][1] <= total:
+                    maxima.pop()
+                maxima.append((seq, total))
+                if maxima[0][0] <= seq - window:
+                    maxima.popleft()
+
+            self.timestamps[slot] = timestamp
+            self.counts[slot] = row
+
+            self.ewma = total if self.ewma is None else self.alpha * total + (1 - self.alpha) * self.ewma
+            self.appended += 1
+
+    def aggregates(self):
+        """
+        Windowed aggregates of the total count
+
+        Returns:
+            dict: latest, ewma, and mean/max for each window (None before the first sample)
+        """
+        with self.lock:
+            if not self.appended:
+                return {"latest": None, "ewma": None, "windows": {}}
+            return {
+                "latest": int(self.counts[(self.appended - 1) % self.capacity, 0]),
+                "ewma": round(self.ewma, 3),
+                "windows": {
+                    str(window): {
+                        "mean": round(self.sums[i] / min(self.appended, window), 3),
+                        "max": self.maxima[i][0][1]
+                    }
+                    for i, window in enumerate(self.windows)
+                }
+            }
+
+    def smoothed(self, method):
+        """Smoothed total: longest-window mean or max, or the EWMA (None before the first sample)"""
+        with self.lock:
+            if not self.appended:
+                return None
+            if method == "ewma":
+                return self.ewma
+            if method == "mean":
+                return self.sums[self.longest] / min(self.appended, self.windows[self.longest])
+            if method == "max":
+                return self.maxima[self.longest][0][1]
+        raise ValueError(f"Unknown smoothing method '{method}'")
+
+    def samples(self, since=None, limit=None):
+        """
+        Stored samples, oldest first
+
+        Args:
+            since (float): Only samples with a later timestamp
+            limit (int): Only the most recent samples
+
+        Returns:
+            list: {"timestamp", "count", "vehicle_types"} dicts
+        """
+        with self.lock:
+            stored = min(self.appended, self.capacity)
+            order = np.arange(self.appended - stored, self.appended) % self.capacity
+            timestamps = self.timestamps[order]
+            counts = self.counts[order]
+
+        if since is not None:
+            keep = timestamps > since
+            timestamps, counts = timestamps[keep], counts[keep]
+        if limit is not None:
+            # Slice from an explicit start: [-0:] would keep everything
+            start = max(len(timestamps) - max(limit, 0), 0)
+            timestamps, counts = timestamps[start:], counts[start:]
+
+        return [
+            {
+                "timestamp": float(ts),
+                "count": int(row[0]),
+                "vehicle_types": dict(zip(VEHICLE_TYPES, row[1:].tolist())) if row[1] >= 0 else None
+            }
+            for ts, row in zip(timestamps, counts)
+        ]
+
+
+class HistoryStore:
+    """Lane histories of every intersection (bounded memory per intersection)"""
+
+    def __init__(self, capacity=1024, windows=(5, 20), alpha=0.3):
+        self.capacity = capacity
+        self.windows = windows
+        self.alpha = alpha
+        self.lanes = {}
+        self.lock = threading.Lock()
+
+    def _lane(self, intersection, direction, create=False):
+        key = (intersection, direction)
+        lane = self.lanes.get(key)
+        if lane is None and create:
+            with self.lock:
+                lane = self.lanes.setdefault(key, LaneHistory(self.capacity, self.windows, self.alpha))
+        return lane
+
+    def record(self, intersection, counts, vehicle_types=None, timestamp=None):
+        """
+        Append one sample per direction
+
+        Args:
+            intersection (str): Intersection ID
+            counts (dict): Direction -> total count
+            vehicle_types (dict): Direction -> {vehicle type: count} (optional)
+            timestamp (float): Sample time in epoch seconds (defaults to now)
+        """
+        for direction, total in counts.items():
+            types = (vehicle_types or {}).get(direction)
+            self._lane(intersection, direction, create=True).append(total, types, timestamp)
+
+    def smoothed(self, intersection, method):
+        """Direction -> smoothed count (only directions with history)"""
+        values = {}
+        for direction in DIRECTIONS:
+            lane = self._lane(intersection, direction)
+            value = lane.smoothed(method) if lane is not None else None
+            if value is not None:
+                values[direction] = value
+        return values
+
+    def query(self, intersection, directions=DIRECTIONS, since=None, limit=None):
+        """
+        Samples and aggregates per direction
+
+        Returns:
+            dict: Direction -> {"aggregates": ..., "samples": [...]}
+        """
+        result = {}
+        for direction in directions:
+            lane = self._lane(intersection, direction)
+            if lane is not None:
+                result[direction] = {"aggregates": lane.aggregates(),
+                                     "samples": lane.samples(since, limit)}
+        return result
@@ -1,25 +1,188 @@
-# This should be at the top of the file
-last_green_direction = None
+import math
+import time
+from datetime import datetime
 
-traffic_data = {"north": 0, "south": 0, "east": 0, "west": 0}
+from .history import MAX_COUNT, SMOOTHING_METHODS, HistoryStore
+from .state_store import DIRECTIONS, InMemoryStateStore
+
+# Intersection used when a request doesn't name one
+DEFAULT_INTERSECTION = "default"
+
+# Counts and last green direction of every intersection
+store = InMemoryStateStore()
+
+# Recent count samples of every lane. They are kept in this process, not in
+# the store, so smoothing is only allowed with the in-process store: with a
+# shared store each worker would smooth over just the counts it received.
+history = HistoryStore()
 
 MAX_GREEN_TIME = 60
 DEFAULT_GREEN_TIME = 30
 
+# Signal timing uses the latest counts when None, else 'mean', 'ewma' or 'max' of the history
+SMOOTHING = None
+
+
+def set_store(new_store):
+    """Replace the state store (e.g. with a shared one for multi-worker deployments)"""
+    global store
+    _check_smoothing(SMOOTHING, new_store)
+    store = new_store
+
 
-def update_traffic_counts(new_data):
+def set_smoothing(method):
+    """Make calculate_signal_times use smoothed history (None for the latest counts)"""
+    global SMOOTHING
+    if method is not None and method not in SMOOTHING_METHODS:
+        raise ValueError(f"Unknown smoothing method '{method}'")
+    _check_smoothing(method, store)
+    SMOOTHING = method
+
+
+def _check_smoothing(method, state_store):
+    """Refuse smoothing with a shared store, whose workers each hold only part of the history"""
+    if method is not None and not isinstance(state_store, InMemoryStateStore):
+        raise ValueError("Smoothed signal timing needs the in-process store: the count history "
+                         "isn't shared between workers")
+
+
+def update_traffic_counts(new_data, intersection=DEFAULT_INTERSECTION):
     try:
-        for direction in traffic_data:
-            if direction in new_data:
-                traffic_data[direction] = int(new_data[direction])
+        # Validate everything before touching the stored state
+        updates = {d: _parse_count(new_data[d], d) for d in DIRECTIONS if d in new_data}
+        vehicle_types = _parse_vehicle_types(new_data.get("vehicle_types"))
+
+        def apply(state):
+            state["counts"].update(updates)
+            return state, None
+
+        store.update(intersection, apply)
+        history.record(intersection, updates, vehicle_types)
         return True, "Counts updated successfully"
     except Exception as e:
         return False, f"Error: {str(e)}"
 
 
-def calculate_signal_times():
-    global last_green_direction
+def _parse_timestamp(value):
+    """Epoch seconds from a number or an ISO 8601 string (None if absent)"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Huge integers overflow and Infinity/NaN would poison the stale-record ordering
+        if not math.isfinite(value):
+            raise ValueError(f"Invalid timestamp {value!r}")
+        return float(value)
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    raise ValueError(f"Invalid timestamp {value!r}")
+
+
+def _parse_vehicle_types(value):
+    """Validate optional per-direction type counts ({direction: {type: count}})"""
+    if value is None:
+        return None
+    if not isinstance(value, dict) or not all(isinstance(types, dict) for types in value.values()):
+        raise ValueError("vehicle_types must map directions to type counts")
+    return {direction: {t: _parse_count(n, t) for t, n in types.items()} for direction, types in value.items()}
+
+
+def _parse_count(value, name):
+    """Integer count between 0 and MAX_COUNT from an int, integral float or numeric string"""
+    if isinstance(value, bool) or (isinstance(value, float) and not (math.isfinite(value) and value.is_integer())):
+        raise ValueError(f"Invalid count for {name}: {value!r}")
+    count = int(value)
+    if not 0 <= count <= MAX_COUNT:
+        raise ValueError(f"Invalid count for {name}: {value!r}")
+    return count
+
+
+def _parse_record(record, default_intersection):
+    """Validate one bulk record into (intersection, count updates, timestamp, vehicle types)"""
+    if not isinstance(record, dict):
+        raise ValueError("Record must be a JSON object")
+
+    intersection = str(record.get("intersection") or default_intersection)
+    updates = {}
+    for d in DIRECTIONS:
+        if d in record:
+            updates[d] = _parse_count(record[d], d)
+    if not updates:
+        raise ValueError("Record has no direction counts")
+
+    return (intersection, updates, _parse_timestamp(record.get("timestamp")),
+            _parse_vehicle_types(record.get("vehicle_types")))
+
+
+def bulk_update_traffic_counts(records, default_intersection=DEFAULT_INTERSECTION):
+    """
+    Apply many count records at once
+
+    All records are validated first. The valid ones are grouped by
+    intersection and each group is applied in one atomic store update, in
+    timestamp order. Records older than the intersection's latest applied
+    timestamp are skipped as stale.
+
+    Args:
+        records (list): Dicts with an intersection, direction counts and an
+            optional timestamp (epoch seconds or ISO 8601)
+        default_intersection (str): Intersection for records that don't name one
 
+    Returns:
+        list: One {"index", "status", "message"} entry per record, in input order
+    """
+    results = [None] * len(records)
+    groups = {}
+
+    # Validate everything in one pass
+    for index, record in enumerate(records):
+        try:
+            intersection, updates, timestamp, vehicle_types = _parse_record(record, default_intersection)
+        except (TypeError, ValueError, OverflowError) as e:
+            results[index] = {"index": index, "status": "error", "message": f"Error: {str(e)}"}
+            continue
+        groups.setdefault(intersection, []).append((index, updates, timestamp, vehicle_types))
+
+    for intersection, group in groups.items():
+        # Untimestamped records keep their order after the timestamped ones
+        group.sort(key=lambda item: (item[2] is None, item[2] or 0.0))
+
+        def apply(state, group=group):
+            statuses = []
+            for index, updates, timestamp, _ in group:
+                latest = state.get("updated_at")
+                if timestamp is not None and latest is not None and timestamp < latest:
+                    statuses.append((index, "stale", "Older than the latest applied counts"))
+                    continue
+                state["counts"].update(updates)
+                if timestamp is not None:
+                    state["updated_at"] = timestamp
+                statuses.append((index, "success", "Counts updated successfully"))
+            return state, statuses
+
+        try:
+            statuses = store.update(intersection, apply)
+        except Exception as e:
+            statuses = [(index, "error", f"Error: {str(e)}") for index, _, _, _ in group]
+
+        # Applied records also go into the lane history, in the order they were applied
+        applied = {index for index, status, _ in statuses if status == "success"}
+        for index, updates, timestamp, vehicle_types in group:
+            if index in applied:
+                history.record(intersection, updates, vehicle_types, timestamp)
+
+        for index, status, message in statuses:
+            results[index] = {"index": index, "status": status, "message": message}
+
+    return results
+
+
+def next_signal_times(traffic_data, last_green_direction):
+    """
+    Choose the next green direction and its green time
+
+    Returns:
+        tuple: (signal times per direction, direction that gets the green)
+    """
     # Skip the last direction that had a green light
     valid_directions = [d for d in traffic_data if d != last_green_direction]
 
@@ -51,7 +214,71 @@ def calculate_signal_times():
         for d in traffic_data
     }
 
-    # Update the last green direction
-    last_green_direction = next_direction
+    return signal_times, next_direction
+
+
+def calculate_signal_times(intersection=DEFAULT_INTERSECTION, smoothing=None):
+    smoothing = smoothing or SMOOTHING
+    _check_smoothing(smoothing, store)
+
+    def advance(state):
+        signal_times, next_direction = next_signal_times(_signal_inputs(state, intersection, smoothing),
+                                                         state["last_green_direction"])
+        # Update the last green direction
+        state["last_green_direction"] = next_direction
+        return state, signal_times
+
+    # Reading the counts and rotating the green happen atomically
+    return store.update(intersection, advance)
+
+
+def advance_phase(intersection=DEFAULT_INTERSECTION, min_phase=1.0, now=None):
+    """
+    The intersection's current signal phase, starting the next one once it has ended
+
+    The phase is kept in the intersection state and its end time is checked
+    inside the atomic store update, so each phase is computed exactly once
+    however many clients, threads or workers (sharing one store) ask for it.
+
+    Args:
+        intersection (str): Intersection ID
+        min_phase (float): Shortest phase in seconds (guards against zero green times)
+        now (float): Current epoch time (defaults to time.time())
+
+    Returns:
+        dict: intersection, phase number, green_direction, signal_times, started_at
+            and ends_at (epoch seconds)
+    """
+    now = time.time() if now is None else now
+    smoothing = SMOOTHING
+
+    def advance(state):
+        phase = state.get("phase")
+        if phase is not None and now < phase["ends_at"]:
+            return state, phase
+
+        signal_times, next_direction = next_signal_times(_signal_inputs(state, intersection, smoothing),
+                                                         state["last_green_direction"])
+        state["last_green_direction"] = next_direction
+        phase = {
+            "intersection": intersection,
+            "phase": (phase["phase"] if phase else 0) + 1,
+            "green_direction": next_direction,
+            "signal_times": signal_times,
+            "started_at": now,
+            "ends_at": now + max(float(signal_times[next_direction]), min_phase)
+        }
+        state["phase"] = phase
+        return state, phase
+
+    return store.update(intersection, advance)
+
 
-    return signal_times
+def _signal_inputs(state, intersection, smoothing):
+    """Counts the signal timing is based on: the latest ones, or their smoothed history"""
+    traffic_data = state["counts"]
+    if smoothing is not None:
+        # Smoothed history instead of a single noisy snapshot
+        smoothed = history.smoothed(intersection, smoothing)
+        traffic_data = {d: int(round(smoothed.get(d, count))) for d, count in traffic_data.items()}
+    return traffic_data
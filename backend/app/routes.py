@@ -1,5 +1,11 @@
-from flask import Blueprint, request, jsonify
-from .logic import update_traffic_counts, calculate_signal_times
+import json
+import queue
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from pipeline_metrics import default_metrics
+from .logic import DEFAULT_INTERSECTION, advance_phase, bulk_update_traffic_counts, update_traffic_counts
+from . import logic
+from .signal_stream import scheduler
 
 traffic_bp = Blueprint("traffic", __name__)
 
@@ -9,13 +15,92 @@ def update_counts():
     data = request.get_json()
     if not data:
         return jsonify({"status": "error", "message": "No data provided"}), 400
+    if not isinstance(data, dict):
+        return jsonify({"status": "error", "message": "Expected a JSON object"}), 400
+
+    # Intersection from the query string or the body (one default intersection otherwise)
+    intersection = request.args.get("intersection") or data.get("intersection") or DEFAULT_INTERSECTION
 
-    success, message = update_traffic_counts(data)
+    success, message = update_traffic_counts(data, intersection)
     status = "success" if success else "error"
     return jsonify({"status": status, "message": message})
 
 
+@traffic_bp.route("/bulk_update_counts", methods=["POST"])
+def bulk_update_counts():
+    # A JSON array of records, or NDJSON with one record per line
+    body = request.get_data(as_text=True).strip()
+    if not body:
+        return jsonify({"status": "error", "message": "No data provided"}), 400
+
+    try:
+        if body.startswith("["):
+            records = json.loads(body)
+        else:
+            records = [json.loads(line) for line in body.splitlines() if line.strip()]
+    except json.JSONDecodeError as e:
+        return jsonify({"status": "error", "message": f"Invalid JSON: {str(e)}"}), 400
+
+    default_intersection = request.args.get("intersection", DEFAULT_INTERSECTION)
+    results = bulk_update_traffic_counts(records, default_intersection)
+
+    applied = sum(1 for result in results if result["status"] == "success")
+    status = "success" if applied == len(results) else ("partial" if applied else "error")
+    return jsonify({
+        "status": status,
+        "message": f"{applied} of {len(results)} records applied",
+        "results": results
+    })
+
+
 @traffic_bp.route("/get_signal_times", methods=["GET"])
 def get_signal_times():
-    signal_times = calculate_signal_times()
-    return jsonify(signal_times)
+    intersection = request.args.get("intersection", DEFAULT_INTERSECTION)
+
+    # Polling returns the running phase; the rotation only advances once it has ended,
+    # in step with the signal stream and any other worker sharing the store
+    phase = advance_phase(intersection, scheduler.min_phase)
+    return jsonify(phase["signal_times"])
+
+
+@traffic_bp.route("/signal_stream", methods=["GET"])
+def signal_stream():
+    # Server-Sent Events: one "phase" event every time the green changes
+    intersection = request.args.get("intersection", DEFAULT_INTERSECTION)
+    subscription = scheduler.subscribe(intersection)
+
+    def events():
+        try:
+            while True:
+                try:
+                    event = subscription.get(timeout=15)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event['phase']}\nevent: phase\ndata: {json.dumps(event)}\n\n"
+        finally:
+            scheduler.unsubscribe(intersection, subscription)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@traffic_bp.route("/history", methods=["GET"])
+def history():
+    intersection = request.args.get("intersection", DEFAULT_INTERSECTION)
+    directions = request.args.getlist("direction") or ["north", "south", "east", "west"]
+    # Samples after an epoch timestamp and/or only the most recent ones
+    since = request.args.get("since", type=float)
+    limit = request.args.get("limit", type=int)
+    if limit is not None and limit < 0:
+        return jsonify({"status": "error", "message": "limit must not be negative"}), 400
+
+    lanes = logic.history.query(intersection, directions, since=since, limit=limit)
+    return jsonify({"intersection": intersection, "lanes": lanes})
+
+
+@traffic_bp.route("/metrics", methods=["GET"])
+def metrics():
+    # Prometheus text exposition format
+    return Response(default_metrics.prometheus_text(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,130 @@
+import heapq
+import itertools
+import queue
+import threading
+import time
+
+from . import logic
+
+
+class PhaseScheduler:
+    """
+    Broadcasts each intersection's signal phases to its subscribers
+
+    A single thread keeps a heap of the times at which the next phase of
+    every watched intersection is due. When a phase is due it asks
+    logic.advance_phase for it, pushes it to every subscriber of that
+    intersection and schedules itself again for when the green ends.
+    advance_phase only computes a phase once the previous one has ended,
+    atomically in the state store, so workers sharing a store (and polling
+    clients) all see the same phases and each phase is computed once.
+    Intersections stop being scheduled once their last subscriber leaves.
+    """
+
+    def __init__(self, min_phase=1.0, subscriber_queue=16):
+        """
+        Args:
+            min_phase (float): Shortest phase in seconds (guards against zero green times)
+            subscriber_queue (int): Phases buffered per subscriber; a slow client
+                loses the oldest ones
+        """
+        self.min_phase = min_phase
+        self.subscriber_queue = subscriber_queue
+        self.condition = threading.Condition()
+        self.subscribers = {}
+        self.phases = {}
+        self.scheduled = set()
+        self.heap = []
+        self.thread = None
+        # Tie-breaker so the heap never compares intersection IDs of equal due times
+        self.sequence = itertools.count()
+
+    def subscribe(self, intersection):
+        """
+        Start receiving an intersection's phases
+
+        Returns:
+            queue.Queue: Phase events, starting with the current phase if there is one
+        """
+        subscription = queue.Queue(maxsize=self.subscriber_queue)
+        with self.condition:
+            subscribers = self.subscribers.setdefault(intersection, set())
+            subscribers.add(subscription)
+            if intersection in self.phases:
+                self._offer(subscription, self.phases[intersection])
+            if intersection not in self.scheduled:
+                # First watcher: compute the first phase right away
+                self.scheduled.add(intersection)
+                self._schedule(intersection, time.monotonic())
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+        return subscription
+
+    def unsubscribe(self, intersection, subscription):
+        """Stop receiving an intersection's phases"""
+        with self.condition:
+            subscribers = self.subscribers.get(intersection)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[intersection]
+
+    def current(self, intersection):
+        """Latest phase of a scheduled intersection (None if nobody is watching it)"""
+        with self.condition:
+            return self.phases.get(intersection)
+
+    def _schedule(self, intersection, due):
+        heapq.heappush(self.heap, (due, next(self.sequence), intersection))
+
+    @staticmethod
+    def _offer(subscription, event):
+        """Queue an event for a subscriber, dropping its oldest one if it's full"""
+        while True:
+            try:
+                subscription.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    subscription.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.heap or self.heap[0][0] > time.monotonic():
+                    self.condition.wait(self.heap[0][0] - time.monotonic() if self.heap else None)
+                _, _, intersection = heapq.heappop(self.heap)
+                if not self.subscribers.get(intersection):
+                    # Nobody is watching any more, so stop scheduling it
+                    self.scheduled.discard(intersection)
+                    self.phases.pop(intersection, None)
+                    continue
+
+            # The running phase, or the next one if it has ended (computed by whichever
+            # worker gets there first)
+            try:
+                event = logic.advance_phase(intersection, self.min_phase)
+            except Exception:
+                # Keep the stream alive and retry once the minimum phase has passed
+                with self.condition:
+                    self._schedule(intersection, time.monotonic() + self.min_phase)
+                continue
+
+            with self.condition:
+                previous = self.phases.get(intersection)
+                if previous is None or previous["phase"] != event["phase"]:
+                    self.phases[intersection] = event
+                    for subscription in self.subscribers.get(intersection, ()):
+                        self._offer(subscription, event)
+                # Phase end times are wall-clock times shared between workers
+                remaining = max(event["ends_at"] - time.time(), 0.0)
+                self._schedule(intersection, time.monotonic() + remaining)
+
+
+# Scheduler shared by every request of this worker process
+scheduler = PhaseScheduler()
@@ -0,0 +1,132 @@
+import copy
+import json
+import threading
+import zlib
+
+DIRECTIONS = ("north", "south", "east", "west")
+
+
+def new_state():
+    """Initial state of an intersection nobody has reported counts for yet"""
+    return {"counts": {d: 0 for d in DIRECTIONS}, "last_green_direction": None, "updated_at": None, "phase": None}
+
+
+class InMemoryStateStore:
+    """
+    Intersection states kept in this process
+
+    Updates are serialized per intersection with a fixed set of striped
+    locks, so requests for different intersections rarely contend and the
+    number of locks doesn't grow with the number of intersections. Use it
+    with a single (multi-threaded) worker process.
+    """
+
+    def __init__(self, stripes=64):
+        self.states = {}
+        self.locks = [threading.Lock() for _ in range(stripes)]
+
+    def _lock(self, intersection):
+        return self.locks[zlib.crc32(intersection.encode()) % len(self.locks)]
+
+    def get(self, intersection):
+        """Return a copy of an intersection's state"""
+        with self._lock(intersection):
+            return copy.deepcopy(self.states.get(intersection) or new_state())
+
+    def update(self, intersection, mutate):
+        """
+        Atomically read-modify-write an intersection's state
+
+        Args:
+            intersection (str): Intersection ID
+            mutate (callable): Takes the current state and returns (new state, result)
+
+        Returns:
+            The result returned by mutate
+        """
+        with self._lock(intersection):
+            state = self.states.get(intersection) or new_state()
+            new, result = mutate(copy.deepcopy(state))
+            self.states[intersection] = new
+            return result
+
+    def intersections(self):
+        """IDs of every intersection with stored state"""
+        return sorted(self.states)
+
+
+class RedisStateStore:
+    """
+    Intersection states kept in Redis (or any Redis-compatible server)
+
+    Shared by every worker process of a multi-worker deployment. Updates
+    are optimistic compare-and-swap transactions (WATCH/MULTI/EXEC) that
+    retry when another worker changed the same intersection in between.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", prefix="traffic", max_retries=50):
+        # Optional dependency, only needed for multi-worker deployments
+        import redis
+
+        self.redis = redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.max_retries = max_retries
+
+    def _key(self, intersection):
+        return f"{self.prefix}:intersection:{intersection}"
+
+    def _decode(self, raw):
+        return json.loads(raw) if raw else new_state()
+
+    def get(self, intersection):
+        """Return an intersection's state"""
+        return self._decode(self.client.get(self._key(intersection)))
+
+    def update(self, intersection, mutate):
+        """
+        Atomically read-modify-write an intersection's state
+
+        Args:
+            intersection (str): Intersection ID
+            mutate (callable): Takes the current state and returns (new state, result)
+
+        Returns:
+            The result returned by mutate
+        """
+        key = self._key(intersection)
+        with self.client.pipeline() as pipe:
+            for _ in range(self.max_retries):
+                try:
+                    pipe.watch(key)
+                    new, result = mutate(self._decode(pipe.get(key)))
+                    pipe.multi()
+                    pipe.set(key, json.dumps(new))
+                    pipe.sadd(f"{self.prefix}:intersections", intersection)
+                    pipe.execute()
+                    return result
+                except self.redis.WatchError:
+                    # Another worker updated this intersection first, so retry on its state
+                    continue
+        raise RuntimeError(f"Too much contention updating intersection '{intersection}'")
+
+    def intersections(self):
+        """IDs of every intersection with stored state"""
+        return sorted(member.decode() for member in self.client.smembers(f"{self.prefix}:intersections"))
+
+
+def create_store(url=None):
+    """
+    Build a state store from a URL
+
+    Args:
+        url (str): 'memory' (or None) for the in-process store, or a redis:// URL
+
+    Returns:
+        InMemoryStateStore or RedisStateStore
+    """
+    if not url or url == "memory":
+        return InMemoryStateStore()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateStore(url)
+    raise ValueError(f"Unsupported state store '{url}'")
@@ -0,0 +1,161 @@
+# Batched HTTP client that pushes vehicle counts to the traffic backend over keep-alive connections
+import http.client
+import json
+import queue
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_BACKEND_URL = "http://127.0.0.1:5000"
+
+# Signal directions understood by the backend
+DIRECTIONS = ("north", "south", "east", "west")
+
+
+def counts_to_record(vehicle_counts, intersection=None, timestamp=None):
+    """
+    Turn a vehicle_counts dict (lane name -> count) into a bulk ingest record
+
+    Lanes are matched to directions by name ('North' -> 'north'); lanes
+    that aren't a direction are left out.
+
+    Args:
+        vehicle_counts (dict): Lane name -> vehicle count
+        intersection (str): Intersection ID (None for the backend's default)
+        timestamp (float): Capture time in epoch seconds (defaults to now)
+
+    Returns:
+        dict: Record for /bulk_update_counts
+    """
+    record = {"timestamp": timestamp if timestamp is not None else time.time()}
+    if intersection is not None:
+        record["intersection"] = intersection
+    for lane, count in vehicle_counts.items():
+        direction = lane.lower()
+        if direction in DIRECTIONS:
+            # Averaged video counts are rounded to whole vehicles
+            record[direction] = int(round(count))
+    return record
+
+
+class CountsPublisher:
+    """
+    Sends count records to /bulk_update_counts in batches
+
+    Records are encoded as NDJSON and sent over a small pool of persistent
+    HTTP connections, so publishing hundreds of intersections costs a few
+    round trips instead of one connection per intersection.
+    """
+
+    def __init__(self, base_url=DEFAULT_BACKEND_URL, batch_size=500, pool_size=2, timeout=10):
+        """
+        Initialize the publisher
+
+        Args:
+            base_url (str): Backend URL, e.g. http://127.0.0.1:5000
+            batch_size (int): Maximum records per request
+            pool_size (int): Maximum idle keep-alive connections kept open
+            timeout (float): Seconds to wait for a response
+        """
+        url = urlsplit(base_url)
+        if url.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported backend URL '{base_url}'")
+
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.path = url.path.rstrip("/") + "/bulk_update_counts"
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.connections = queue.LifoQueue(maxsize=pool_size)
+
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        """Buffer a record, sending a batch once batch_size records are waiting"""
+        with self.lock:
+            self.pending.append(record)
+            if len(self.pending) < self.batch_size:
+                return []
+            batch, self.pending = self.pending, []
+        return self.publish(batch)
+
+    def flush(self):
+        """Send every buffered record"""
+        with self.lock:
+            batch, self.pending = self.pending, []
+        return self.publish(batch) if batch else []
+
+    def publish(self, records):
+        """
+        Send records in batches of at most batch_size
+
+        Returns:
+            list: The backend's per-record status entries, in input order
+        """
+        results = []
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            body = "\n".join(json.dumps(record) for record in batch).encode()
+            response = self._post(body)
+            # Shift indices so they refer to the caller's list
+            for result in response.get("results", []):
+                result["index"] += start
+                results.append(result)
+        return results
+
+    def _connection(self):
+        try:
+            return self.connections.get_nowait()
+        except queue.Empty:
+            if self.scheme == "https":
+                return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _release(self, connection):
+        try:
+            self.connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _post(self, body):
+        """POST one NDJSON batch, retrying once on a stale keep-alive connection"""
+        headers = {"Content-Type": "application/x-ndjson", "Connection": "keep-alive"}
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request("POST", self.path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                # The server may have closed an idle connection; retry on a fresh one
+                if attempt:
+                    raise
+                continue
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+
+            payload = json.loads(data) if data else {}
+            if response.status >= 400:
+                raise RuntimeError(payload.get("message", f"Backend returned HTTP {response.status}"))
+            return payload
+
+    def close(self):
+        """Send buffered records and close the pooled connections"""
+        self.flush()
+        while True:
+            try:
+                self.connections.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
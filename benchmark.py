@@ -0,0 +1,495 @@
+# Benchmark suite for the detector and the signal logic, with regression checks against a baseline
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from model_backends import find_calibration_images
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(REPO_ROOT, "backend")
+
+# Relative change beyond which a metric counts as a regression
+DEFAULT_THRESHOLD = 0.10
+
+# Startup paths that must not load the model stack: (name, working directory, code to time)
+STARTUP_CASES = [
+    ("cli_help", REPO_ROOT,
+     "sys.argv = ['vehicle_detector.py', '--help']\n"
+     "runpy.run_path('vehicle_detector.py', run_name='__main__')"),
+    ("export_json", REPO_ROOT, "from vehicle_detector import export_json"),
+    ("backend_run", BACKEND_DIR, "import run")
+]
+
+# Runs one startup case in a fresh interpreter and prints its import time as JSON
+_STARTUP_PROBE = """
+import contextlib, io, json, runpy, sys, time
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    try:
+{body}
+    except SystemExit:
+        pass
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy_modules": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def make_synthetic_video(image_path, output_path, frames=120, size=(640, 360), fps=15):
+    """
+    Write a synthetic traffic video by panning a window across a lane image
+
+    The frames contain real vehicles from the bundled images, so the detector
+    does the same amount of work it would on camera footage.
+
+    Args:
+        image_path (str): Source lane image
+        output_path (str): Path of the video to write
+        frames (int): Number of frames
+        size (tuple): Frame (width, height)
+        fps (int): Frame rate of the video
+
+    Returns:
+        str: output_path
+    """
+    import cv2
+
+    width, height = size
+    image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError(f"Could not read image at {image_path}")
+
+    # Scale the image so it is wider than a frame and there is room to pan
+    scale = max(1.5 * width / image.shape[1], height / image.shape[0])
+    image = cv2.resize(image, (int(image.shape[1] * scale), int(image.shape[0] * scale)))
+    max_x = image.shape[1] - width
+    max_y = image.shape[0] - height
+
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for index in range(frames):
+        x = int(max_x * index / max(1, frames - 1))
+        writer.write(image[max_y // 2:max_y // 2 + height, x:x + width])
+    writer.release()
+    return output_path
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where it can't be measured)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def latency_stats(seconds):
+    """
+    Summarize latency samples
+
+    Returns:
+        dict: mean, p50, p95, p99, min and max in milliseconds
+    """
+    import numpy as np
+
+    samples = np.asarray(seconds, dtype=np.float64) * 1000
+    if not samples.size:
+        return {}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "mean": round(float(samples.mean()), 4),
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+        "min": round(float(samples.min()), 4),
+        "max": round(float(samples.max()), 4)
+    }
+
+
+def _bench_detector(case):
+    """Time one detector method under one configuration (runs in a fresh process)"""
+    from pipeline_metrics import StageMetrics
+    from vehicle_detector import VehicleDetector
+
+    params = case["params"]
+    metrics = StageMetrics()
+    detector = VehicleDetector(model_size=params["model"], confidence=params["conf"], metrics=metrics)
+    detector.warmup()
+
+    images = case["images"]
+    lane_images = {os.path.splitext(os.path.basename(p))[0].capitalize(): p for p in images}
+
+    latencies = []
+    items = 0
+    for _ in range(case["repeats"]):
+        if case["bench"] == "detect_vehicles":
+            # One sample per image
+            for image_path in images:
+                start = time.perf_counter()
+                detector.detect_vehicles(image_path)
+                latencies.append(time.perf_counter() - start)
+                items += 1
+        elif case["bench"] == "process_lanes":
+            start = time.perf_counter()
+            detector.process_lanes(lane_images, batch_size=params["batch_size"])
+            latencies.append(time.perf_counter() - start)
+            items += len(lane_images)
+        elif case["bench"] == "process_video":
+            start = time.perf_counter()
+            result = detector.process_video(case["video"], frame_interval=params["frame_interval"])
+            latencies.append(time.perf_counter() - start)
+            items += result.get("processed_frames", 0)
+
+    units = {"detect_vehicles": "images/s", "process_lanes": "lanes/s", "process_video": "frames/s"}
+    return {
+        "samples": len(latencies),
+        "latency_ms": latency_stats(latencies),
+        "throughput": round(items / sum(latencies), 3) if sum(latencies) else 0.0,
+        "throughput_unit": units[case["bench"]],
+        "stage_metrics": metrics.summary()
+    }
+
+
+def _bench_signal_logic(case):
+    """Time update_traffic_counts + calculate_signal_times on random counts"""
+    import numpy as np
+
+    sys.path.insert(0, BACKEND_DIR)
+    from app.logic import calculate_signal_times, update_traffic_counts
+
+    iterations = case["params"]["iterations"]
+    rng = np.random.default_rng(0)
+    samples = rng.integers(0, 60, size=(iterations, 4)).tolist()
+
+    latencies = []
+    for north, south, east, west in samples:
+        start = time.perf_counter()
+        update_traffic_counts({"north": north, "south": south, "east": east, "west": west})
+        calculate_signal_times()
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "samples": len(latencies),
+        "latency_ms": latency_stats(latencies),
+        "throughput": round(len(latencies) / sum(latencies), 3),
+        "throughput_unit": "cycles/s"
+    }
+
+
+def _run_case(case):
+    """Entry point of a case's worker process"""
+    sys.path.insert(0, REPO_ROOT)
+    from intersection_scheduler import pin_threads
+    pin_threads(case["params"].get("threads", 1))
+
+    if case["bench"] == "signal_logic":
+        result = _bench_signal_logic(case)
+    else:
+        result = _bench_detector(case)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def case_name(bench, params):
+    """Stable identifier used to match a case against the baseline"""
+    return f"{bench}[" + ",".join(f"{key}={value}" for key, value in params.items()) + "]"
+
+
+def build_cases(benches, models, confs, batch_sizes, frame_intervals, threads, signal_iterations):
+    """
+    Expand the sweep into individual benchmark cases
+
+    Returns:
+        list: (bench, params) tuples
+    """
+    cases = []
+    for model, conf, thread_count in itertools.product(models, confs, threads):
+        base = {"model": model, "conf": conf, "threads": thread_count}
+        if "detect_vehicles" in benches:
+            cases.append(("detect_vehicles", dict(base)))
+        if "process_lanes" in benches:
+            for batch_size in batch_sizes:
+                cases.append(("process_lanes", {**base, "batch_size": batch_size}))
+        if "process_video" in benches:
+            for frame_interval in frame_intervals:
+                cases.append(("process_video", {**base, "frame_interval": frame_interval}))
+    if "signal_logic" in benches:
+        cases.append(("signal_logic", {"iterations": signal_iterations}))
+    return cases
+
+
+def run_benchmarks(cases, images, video, repeats=3):
+    """
+    Run every case in its own process
+
+    A fresh process per case keeps peak RSS and thread pinning per
+    configuration instead of accumulating across the sweep.
+
+    Args:
+        cases (list): (bench, params) tuples from build_cases
+        images (list): Lane image paths
+        video (str): Video path for the process_video cases
+        repeats (int): Timed passes per case (after a warm-up)
+
+    Returns:
+        dict: Environment info and one result per case
+    """
+    import numpy as np
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__
+        },
+        "results": []
+    }
+
+    context = get_context("spawn")
+    for bench, params in cases:
+        name = case_name(bench, params)
+        print(f"Running {name}...")
+        case = {"bench": bench, "params": params, "images": images, "video": video, "repeats": repeats}
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            try:
+                result = pool.submit(_run_case, case).result()
+            except Exception as e:
+                print(f"  failed: {e}")
+                result = {"error": str(e)}
+        report["results"].append({"name": name, "bench": bench, "params": params, **result})
+    return report
+
+
+def compare_reports(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare a benchmark report against a baseline
+
+    A case regresses when its p50 or p95 latency or its peak RSS grows, or
+    its throughput drops, by more than threshold (relative).
+
+    Args:
+        baseline (dict): Baseline report
+        current (dict): New report
+        threshold (float): Allowed relative change
+
+    Returns:
+        list: One row per case present in both reports
+    """
+    baseline_results = {r["name"]: r for r in baseline["results"] if "error" not in r}
+
+    rows = []
+    for result in current["results"]:
+        reference = baseline_results.get(result["name"])
+        if reference is None or "error" in result:
+            continue
+
+        # (metric, baseline value, current value, higher is better)
+        checks = [
+            ("p50_ms", reference["latency_ms"].get("p50"), result["latency_ms"].get("p50"), False),
+            ("p95_ms", reference["latency_ms"].get("p95"), result["latency_ms"].get("p95"), False),
+            ("throughput", reference.get("throughput"), result.get("throughput"), True),
+            ("peak_rss_mb", reference.get("peak_rss_mb"), result.get("peak_rss_mb"), False)
+        ]
+
+        changes = {}
+        regressions = []
+        for metric, old, new, higher_is_better in checks:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            changes[metric] = round(change, 4)
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append(metric)
+
+        rows.append({"name": result["name"], "changes": changes, "regressions": regressions})
+    return rows
+
+
+def print_results(report):
+    """Print a results table"""
+    print(f"\n{'Case':<60}{'p50 ms':>10}{'p95 ms':>10}{'throughput':>24}{'peak MB':>10}")
+    for result in report["results"]:
+        if "error" in result:
+            print(f"{result['name']:<60}  error: {result['error']}")
+            continue
+        throughput = f"{result['throughput']} {result['throughput_unit']}"
+        print(f"{result['name']:<60}{result['latency_ms']['p50']:>10}{result['latency_ms']['p95']:>10}"
+              f"{throughput:>24}{str(result['peak_rss_mb']):>10}")
+
+
+def print_comparison(rows, threshold):
+    """Print per-case relative changes and flag regressions"""
+    print(f"\n{'Case':<60}{'p50':>9}{'p95':>9}{'thrpt':>9}{'rss':>9}  status")
+    for row in rows:
+        changes = row["changes"]
+        cells = "".join(
+            f"{changes[m] * 100:>+8.1f}%" if m in changes else f"{'-':>9}"
+            for m in ("p50_ms", "p95_ms", "throughput", "peak_rss_mb")
+        )
+        status = "REGRESSION (" + ", ".join(row["regressions"]) + ")" if row["regressions"] else "ok"
+        print(f"{row['name']:<60}{cells}  {status}")
+
+    regressed = sum(1 for row in rows if row["regressions"])
+    print(f"\n{regressed} of {len(rows)} cases regressed by more than {threshold * 100:.0f}%")
+
+
+def measure_startup(repeats=5):
+    """
+    Time each startup path in fresh interpreters
+
+    Every run also reports which heavy modules (see lazy_imports.HEAVY_MODULES)
+    ended up imported.
+
+    Args:
+        repeats (int): Fresh interpreters per case
+
+    Returns:
+        list: One result per case with the median and best time in seconds
+    """
+    from lazy_imports import HEAVY_MODULES
+
+    results = []
+    for name, cwd, code in STARTUP_CASES:
+        body = "\n".join("        " + line for line in code.splitlines())
+        probe = _STARTUP_PROBE.format(body=body, heavy=HEAVY_MODULES)
+
+        times = []
+        heavy_modules = set()
+        error = None
+        for _ in range(repeats):
+            completed = subprocess.run([sys.executable, "-c", probe], cwd=cwd, capture_output=True,
+                                       text=True, timeout=120)
+            if completed.returncode != 0:
+                error = (completed.stderr.strip().splitlines() or [f"exit code {completed.returncode}"])[-1]
+                break
+            measured = json.loads(completed.stdout.strip().splitlines()[-1])
+            times.append(measured["seconds"])
+            heavy_modules.update(measured["heavy_modules"])
+
+        if error:
+            results.append({"name": name, "error": error})
+            continue
+        times.sort()
+        results.append({
+            "name": name,
+            "seconds": round(times[len(times) // 2], 4),
+            "best_seconds": round(times[0], 4),
+            "heavy_modules": sorted(heavy_modules)
+        })
+    return results
+
+
+def print_startup(results, budget):
+    """
+    Print startup times against the budget
+
+    Returns:
+        bool: True if every case ran within budget without loading heavy modules
+    """
+    print(f"\n{'Startup path':<16}{'median s':>10}{'best s':>10}  status")
+    passed = True
+    for result in results:
+        if "error" in result:
+            print(f"{result['name']:<16}{'-':>10}{'-':>10}  error: {result['error']}")
+            passed = False
+            continue
+        problems = []
+        if result["seconds"] > budget:
+            problems.append(f"over {budget}s budget")
+        if result["heavy_modules"]:
+            problems.append("imported " + ", ".join(result["heavy_modules"]))
+        passed = passed and not problems
+        print(f"{result['name']:<16}{result['seconds']:>10}{result['best_seconds']:>10}  "
+              f"{'; '.join(problems) or 'ok'}")
+    return passed
+
+
+def main():
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Benchmark the vehicle detector and signal logic")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmark sweep")
+    run_parser.add_argument("--benches", nargs="+",
+                            default=["detect_vehicles", "process_lanes", "process_video", "signal_logic"],
+                            choices=["detect_vehicles", "process_lanes", "process_video", "signal_logic"],
+                            help="Benchmarks to run")
+    run_parser.add_argument("--images", default="images", help="Directory of lane images")
+    run_parser.add_argument("--video", default=None,
+                            help="Video for process_video (default: synthetic video built from the images)")
+    run_parser.add_argument("--models", nargs="+", default=["n"], choices=["n", "s", "m", "l", "x"],
+                            help="YOLOv8 model sizes")
+    run_parser.add_argument("--confs", nargs="+", type=float, default=[0.25], help="Confidence thresholds")
+    run_parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 4],
+                            help="process_lanes batch sizes")
+    run_parser.add_argument("--frame-intervals", nargs="+", type=int, default=[15],
+                            help="process_video frame intervals")
+    run_parser.add_argument("--threads", nargs="+", type=int, default=[1], help="Model thread counts")
+    run_parser.add_argument("--repeats", type=int, default=3, help="Timed passes per case")
+    run_parser.add_argument("--signal-iterations", type=int, default=10000,
+                            help="Signal logic cycles to time")
+    run_parser.add_argument("--output", default="benchmark_results.json", help="Output JSON report")
+
+    compare_parser = subparsers.add_parser("compare", help="Flag regressions against a baseline report")
+    compare_parser.add_argument("baseline", help="Baseline JSON report")
+    compare_parser.add_argument("current", help="New JSON report")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="Allowed relative change before a case counts as a regression")
+
+    startup_parser = subparsers.add_parser(
+        "startup", help="Check that the CLI, export_json and the backend start without loading the model stack")
+    startup_parser.add_argument("--budget", type=float, default=1.0,
+                                help="Maximum median seconds for each startup path")
+    startup_parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per startup path")
+    args = parser.parse_args()
+
+    if args.command == "startup":
+        passed = print_startup(measure_startup(args.repeats), args.budget)
+        # Non-zero exit so CI jobs fail when startup gets slow again
+        sys.exit(0 if passed else 1)
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        rows = compare_reports(baseline, current, args.threshold)
+        print_comparison(rows, args.threshold)
+        # Non-zero exit so CI jobs fail on a regression
+        sys.exit(1 if any(row["regressions"] for row in rows) else 0)
+
+    images = find_calibration_images(args.images)
+    if not images and set(args.benches) - {"signal_logic"}:
+        print(f"No images found in {args.images}")
+        return
+
+    cases = build_cases(args.benches, args.models, args.confs, args.batch_sizes,
+                        args.frame_intervals, args.threads, args.signal_iterations)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video = args.video
+        if video is None and "process_video" in args.benches:
+            video = make_synthetic_video(images[0], os.path.join(tmp_dir, "synthetic.mp4"))
+
+        report = run_benchmarks(cases, [os.path.abspath(p) for p in images],
+                                os.path.abspath(video) if video else None, repeats=args.repeats)
+
+    print_results(report)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results exported to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
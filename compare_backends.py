@@ -0,0 +1,152 @@
+# Accuracy/latency comparison of inference backends on the lane images
+import time
+
+import numpy as np
+
+from model_backends import BACKENDS, find_calibration_images
+from vehicle_detector import VehicleDetector, export_json
+from vehicle_tracker import iou_matrix
+
+
+def match_f1(reference, candidate, iou_threshold=0.5):
+    """
+    F1 score of candidate detections against reference detections
+
+    A candidate matches a reference box of the same vehicle type when their
+    IoU is at least iou_threshold; each box is matched at most once.
+    """
+    if not len(reference) and not len(candidate):
+        return 1.0
+    if not len(reference) or not len(candidate):
+        return 0.0
+
+    ious = iou_matrix(reference.boxes.astype(np.float64), candidate.boxes.astype(np.float64))
+    ious[reference.types[:, None] != candidate.types[None, :]] = 0.0
+
+    matched = 0
+    while ious.size and ious.max() >= iou_threshold:
+        ref_row, cand_row = np.unravel_index(np.argmax(ious), ious.shape)
+        ious[ref_row, :] = 0.0
+        ious[:, cand_row] = 0.0
+        matched += 1
+
+    precision = matched / len(candidate)
+    recall = matched / len(reference)
+    return 2 * precision * recall / (precision + recall) if matched else 0.0
+
+
+def compare_backends(image_paths, model_size="n", imgsz=640, confidence=0.25, runs=5, configs=None):
+    """
+    Measure latency and agreement with PyTorch for each backend/precision
+
+    Args:
+        image_paths (list): Images to run every backend on
+        model_size (str): Size of YOLOv8 model ('n', 's', 'm', 'l', 'x')
+        imgsz (int): Model input resolution
+        confidence (float): Detection confidence threshold
+        runs (int): Timed passes over the images per backend
+        configs (list): (backend, precision) pairs (defaults to every supported pair)
+
+    Returns:
+        dict: Report keyed by "backend-precision"
+    """
+    if configs is None:
+        configs = [(backend, precision) for backend, precisions in BACKENDS.items()
+                   for precision in precisions]
+
+    report = {}
+    reference = None
+
+    for backend, precision in configs:
+        name = f"{backend}-{precision}"
+        print(f"Benchmarking {name}...")
+
+        start_time = time.time()
+        try:
+            detector = VehicleDetector(model_size=model_size, confidence=confidence,
+                                       backend=backend, imgsz=imgsz, precision=precision)
+        except (ImportError, ValueError, RuntimeError) as e:
+            report[name] = {"error": str(e)}
+            continue
+        load_time = time.time() - start_time
+
+        # Warm up, and keep these results for the accuracy comparison
+        outputs = [detector.detect_vehicles(path) for path in image_paths]
+
+        latencies = []
+        for _ in range(runs):
+            for path in image_paths:
+                start_time = time.perf_counter()
+                detector.detect_vehicles(path)
+                latencies.append(time.perf_counter() - start_time)
+        latencies = np.array(latencies) * 1000
+
+        # First backend that loads is the accuracy reference
+        if reference is None:
+            reference = (name, outputs)
+
+        ref_outputs = reference[1]
+        count_errors = [abs(out["total_count"] - ref["total_count"]) for out, ref in zip(outputs, ref_outputs)]
+        f1_scores = [match_f1(ref["detections"], out["detections"]) for out, ref in zip(outputs, ref_outputs)]
+
+        report[name] = {
+            "load_time_s": round(load_time, 2),
+            "latency_ms": {
+                "mean": round(float(latencies.mean()), 1),
+                "p50": round(float(np.percentile(latencies, 50)), 1),
+                "p95": round(float(np.percentile(latencies, 95)), 1)
+            },
+            "reference": reference[0],
+            "count_mae": round(float(np.mean(count_errors)), 2),
+            "box_f1": round(float(np.mean(f1_scores)), 3),
+            "total_counts": [out["total_count"] for out in outputs]
+        }
+
+    # Speedup relative to the reference backend
+    if reference is not None:
+        ref_latency = report[reference[0]]["latency_ms"]["mean"]
+        for entry in report.values():
+            if "latency_ms" in entry and entry["latency_ms"]["mean"] > 0:
+                entry["speedup"] = round(ref_latency / entry["latency_ms"]["mean"], 2)
+
+    return report
+
+
+def print_report(report):
+    """Print the comparison as a table"""
+    print(f"\n{'Backend':<18}{'mean ms':>10}{'p95 ms':>10}{'speedup':>10}{'count MAE':>12}{'box F1':>9}")
+    print("-" * 69)
+    for name, entry in report.items():
+        if "error" in entry:
+            print(f"{name:<18}unavailable: {entry['error']}")
+            continue
+        latency = entry["latency_ms"]
+        print(f"{name:<18}{latency['mean']:>10}{latency['p95']:>10}{entry.get('speedup', 1.0):>10}"
+              f"{entry['count_mae']:>12}{entry['box_f1']:>9}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare inference backends on lane images")
+    parser.add_argument("--images", default="images", help="Directory of lane images")
+    parser.add_argument("--model", default="n", choices=["n", "s", "m", "l", "x"], help="YOLOv8 model size")
+    parser.add_argument("--imgsz", type=int, default=640, help="Model input resolution")
+    parser.add_argument("--conf", type=float, default=0.25, help="Confidence threshold")
+    parser.add_argument("--runs", type=int, default=5, help="Timed passes over the images per backend")
+    parser.add_argument("--output", default="backend_report.json", help="Output JSON report")
+    args = parser.parse_args()
+
+    image_paths = find_calibration_images(args.images)
+    if not image_paths:
+        print(f"No images found in {args.images}")
+        return
+
+    report = compare_backends(image_paths, model_size=args.model, imgsz=args.imgsz,
+                              confidence=args.conf, runs=args.runs)
+    print_report(report)
+    export_json(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+# Long-lived detector worker: loads the model once and serves detection jobs over a local socket
+import json
+import os
+import socket
+import socketserver
+import threading
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+class DetectorService:
+    """Runs detection jobs against one warmed VehicleDetector"""
+
+    def __init__(self, detector):
+        """
+        Initialize the service
+
+        Args:
+            detector (VehicleDetector): Detector shared by every job
+        """
+        self.detector = detector
+        # The model is not thread-safe, so jobs run one at a time
+        self.lock = threading.Lock()
+
+    def handle(self, job):
+        """
+        Run a single job
+
+        Args:
+            job (dict): {"op": ..., plus the keyword arguments of that detector method}
+
+        Returns:
+            dict: {"status": "success", "result": ...} or {"status": "error", "message": ...}
+        """
+        op = job.get("op")
+        params = {key: value for key, value in job.items() if key != "op"}
+
+        try:
+            if op == "ping":
+                return {"status": "success", "result": "pong"}
+
+            with self.lock:
+                if op == "detect_vehicles":
+                    result = self.detector.detect_vehicles(**params)
+                    result["detections"] = result["detections"].to_list()
+                elif op == "process_lanes":
+                    result = self.detector.process_lanes(**params)
+                elif op == "process_video":
+                    result = self.detector.process_video(**params)
+                else:
+                    return {"status": "error", "message": f"Unknown op '{op}'"}
+
+            return {"status": "success", "result": result}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    """Reads one JSON job per line and writes one JSON response per line"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.service.handle(json.loads(line))
+            except json.JSONDecodeError as e:
+                response = {"status": "error", "message": f"Invalid JSON: {e}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def serve(detector, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    Warm the detector up and serve jobs until interrupted
+
+    Args:
+        detector (VehicleDetector): Detector to serve
+        host (str): Interface to listen on (keep it local)
+        port (int): TCP port to listen on
+    """
+    print("Warming up model...")
+    detector.warmup()
+
+    with _ThreadingServer((host, port), _JobHandler) as server:
+        server.service = DetectorService(detector)
+        print(f"Detector service listening on {host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Shutting down detector service")
+
+
+class DetectorClient:
+    """
+    Thin client with the same methods as VehicleDetector
+
+    Jobs are sent to a running detector service, so the caller never
+    imports or loads the model itself.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=300):
+        """
+        Initialize the client
+
+        Args:
+            host (str): Detector service host
+            port (int): Detector service port
+            timeout (float): Seconds to wait for a job to finish
+        """
+        self.address = (host, port)
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+
+    def detect_vehicles(self, image_path, save_output=False, lane=None):
+        """Run VehicleDetector.detect_vehicles on the service"""
+        return self._call("detect_vehicles", image_path=os.path.abspath(image_path),
+                          save_output=save_output, lane=lane)
+
+    def process_lanes(self, lane_images, save_output=False, batch_size=None):
+        """Run VehicleDetector.process_lanes on the service"""
+        # The service may run from another directory, so send absolute paths
+        lane_images = {lane: os.path.abspath(path) for lane, path in lane_images.items()}
+        return self._call("process_lanes", lane_images=lane_images, save_output=save_output,
+                          batch_size=batch_size)
+
+    def process_video(self, video_path, output_path=None, **kwargs):
+        """Run VehicleDetector.process_video on the service"""
+        if output_path:
+            output_path = os.path.abspath(output_path)
+        if kwargs.get("segment_log"):
+            kwargs["segment_log"] = os.path.abspath(kwargs["segment_log"])
+        return self._call("process_video", video_path=os.path.abspath(video_path),
+                          output_path=output_path, **kwargs)
+
+    def ping(self):
+        """Return True if the service is reachable"""
+        try:
+            return self._call("ping") == "pong"
+        except OSError:
+            return False
+
+    def close(self):
+        """Close the connection to the service"""
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+            self.sock = self.reader = None
+
+    def _call(self, op, **params):
+        """Send one job and wait for its result"""
+        if self.sock is None:
+            self.sock = socket.create_connection(self.address, timeout=self.timeout)
+            self.reader = self.sock.makefile("rb")
+
+        try:
+            self.sock.sendall(json.dumps({"op": op, **params}).encode() + b"\n")
+            line = self.reader.readline()
+        except OSError:
+            self.close()
+            raise
+        if not line:
+            self.close()
+            raise ConnectionError("Detector service closed the connection")
+
+        response = json.loads(line)
+        if response["status"] != "success":
+            raise RuntimeError(response["message"])
+        return response["result"]
+
+
+def parse_address(address):
+    """Split 'host:port' (or just 'port') into a (host, port) tuple"""
+    host, _, port = address.rpartition(":")
+    return host or DEFAULT_HOST, int(port)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Persistent YOLO vehicle detector service")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port to listen on")
+    parser.add_argument("--model", default="n", choices=["n", "s", "m", "l", "x"], help="YOLOv8 model size")
+    parser.add_argument("--conf", type=float, default=0.25, help="Confidence threshold")
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "openvino"],
+                        help="Inference backend")
+    parser.add_argument("--imgsz", type=int, default=640, help="Model input resolution")
+    parser.add_argument("--precision", default="fp32", choices=["fp32", "fp16", "int8"],
+                        help="Backend precision")
+    args = parser.parse_args()
+
+    # Only the service itself pays for loading the model
+    from vehicle_detector import VehicleDetector
+
+    detector = VehicleDetector(model_size=args.model, confidence=args.conf,
+                               backend=args.backend, imgsz=args.imgsz, precision=args.precision)
+    serve(detector, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+// Live signal phases pushed by the backend over Server-Sent Events
+
+/**
+ * Subscribes to the signal phases of one intersection
+ * @param {Function} onPhase - Called with each phase ({ green_direction, signal_times, started_at, ends_at, ... })
+ * @param {Object} options - { baseUrl, intersection, onError }
+ * @returns {Function} - Call to close the stream
+ */
+export function subscribeToSignalTimes(onPhase, { baseUrl = 'http://127.0.0.1:5000', intersection = 'default', onError } = {}) {
+  const url = `${baseUrl}/signal_stream?intersection=${encodeURIComponent(intersection)}`
+  // EventSource reconnects on its own if the connection drops
+  const source = new EventSource(url)
+
+  source.addEventListener('phase', event => {
+    onPhase(JSON.parse(event.data))
+  })
+
+  if (onError) {
+    source.onerror = onError
+  }
+
+  return () => source.close()
+}
@@ -0,0 +1,208 @@
+# Parallel lane detection for many intersections on a pool of detector worker processes
+import multiprocessing
+import os
+import time
+from itertools import zip_longest
+
+# Detector owned by each worker process
+_worker_detector = None
+
+
+def pin_threads(threads):
+    """Limit the compute threads of this process (call before the model is loaded)"""
+    # Must be set before torch/OpenCV start their thread pools
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    import cv2
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _init_worker(threads, detector_options):
+    """Pin the worker's thread count, then load and warm its own model"""
+    global _worker_detector
+
+    pin_threads(threads)
+
+    from vehicle_detector import VehicleDetector
+
+    _worker_detector = VehicleDetector(**detector_options)
+    _worker_detector.warmup()
+
+
+def _detect_lane(job):
+    """Run detection for one lane of one intersection inside a worker"""
+    intersection, lane_name, image_path, save_output = job
+
+    start_time = time.time()
+    try:
+        # Every intersection has a north.jpg etc., so annotated images go to output/<intersection>/
+        results = _worker_detector.detect_vehicles(image_path, save_output, lane=f"{intersection}/{lane_name}",
+                                                   output_dir=os.path.join("output", intersection))
+    except Exception as e:
+        return intersection, lane_name, {"error": str(e)}
+    processing_time = time.time() - start_time
+
+    return intersection, lane_name, {
+        "count": results["total_count"],
+        "vehicle_types": results["vehicle_types"],
+        "processing_time": round(processing_time, 3)
+    }
+
+
+class IntersectionScheduler:
+    """
+    Spreads lane jobs from many intersections across detector worker processes
+
+    Every worker holds its own warmed model and a fixed number of compute
+    threads, so workers don't oversubscribe the cores. Jobs are interleaved
+    across intersections so a large intersection can't starve the others.
+    """
+
+    def __init__(self, workers=None, threads_per_worker=1, **detector_options):
+        """
+        Initialize the scheduler and start the worker pool
+
+        Args:
+            workers (int): Number of worker processes (defaults to cores / threads_per_worker)
+            threads_per_worker (int): Intra-op threads for each worker's model
+            **detector_options: Keyword arguments for each worker's VehicleDetector
+        """
+        if workers is None:
+            workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+
+        self.workers = workers
+        # Spawn so workers don't inherit the parent's torch thread pools
+        context = multiprocessing.get_context("spawn")
+        self.pool = context.Pool(workers, initializer=_init_worker,
+                                 initargs=(threads_per_worker, detector_options))
+
+    def process_intersections(self, intersections, save_output=False):
+        """
+        Process the lane images of many intersections in parallel
+
+        Args:
+            intersections (dict): Intersection id -> {lane name: image path}
+            save_output (bool): Whether to save annotated images (to output/<intersection>/)
+
+        Returns:
+            dict: Intersection id -> results in the process_lanes format
+        """
+        # Round-robin over intersections: first lane of each, then the second, ...
+        per_intersection = [
+            [(intersection, lane_name, image_path, save_output)
+             for lane_name, image_path in lane_images.items()]
+            for intersection, lane_images in intersections.items()
+        ]
+        jobs = [job for round_jobs in zip_longest(*per_intersection) for job in round_jobs if job]
+
+        lane_results = {intersection: {} for intersection in intersections}
+        for intersection, lane_name, result in self.pool.imap_unordered(_detect_lane, jobs):
+            lane_results[intersection][lane_name] = result
+
+        output = {}
+        for intersection, lane_images in intersections.items():
+            # Keep the caller's lane order
+            results = {lane: lane_results[intersection][lane] for lane in lane_images}
+            output[intersection] = {
+                "vehicle_counts": {lane: data["count"] for lane, data in results.items() if "count" in data},
+                "detailed_results": results
+            }
+
+        return output
+
+    def close(self):
+        """Stop the worker processes"""
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def find_intersections(root):
+    """
+    Build the intersections mapping from a directory tree
+
+    Every subdirectory of root is an intersection and every image inside it
+    a lane, named after the file like the 'images' CLI mode does.
+    """
+    intersections = {}
+    for name in sorted(os.listdir(root)):
+        directory = os.path.join(root, name)
+        if not os.path.isdir(directory):
+            continue
+        lane_images = {
+            os.path.splitext(f)[0].capitalize(): os.path.join(directory, f)
+            for f in sorted(os.listdir(directory))
+            if f.lower().endswith(('.jpg', '.jpeg', '.png'))
+        }
+        if lane_images:
+            intersections[name] = lane_images
+    return intersections
+
+
+def main():
+    import argparse
+    import json
+
+    from backend_client import DEFAULT_BACKEND_URL, CountsPublisher, counts_to_record
+
+    parser = argparse.ArgumentParser(description="Parallel vehicle detection across intersections")
+    parser.add_argument("--input", required=True,
+                        help="Directory with one subdirectory of lane images per intersection")
+    parser.add_argument("--output", default="intersection_counts.json", help="Output JSON file")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: cores / threads)")
+    parser.add_argument("--threads", type=int, default=1, help="Model threads per worker")
+    parser.add_argument("--save-visuals", action="store_true", help="Save annotated images")
+    parser.add_argument("--model", default="n", choices=["n", "s", "m", "l", "x"], help="YOLOv8 model size")
+    parser.add_argument("--conf", type=float, default=0.25, help="Confidence threshold")
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "openvino"],
+                        help="Inference backend")
+    parser.add_argument("--publish", nargs="?", const=DEFAULT_BACKEND_URL, default=None, metavar="URL",
+                        help=f"Push every intersection's counts to the traffic backend in one batch "
+                             f"(default URL: {DEFAULT_BACKEND_URL})")
+    args = parser.parse_args()
+
+    intersections = find_intersections(args.input)
+    if not intersections:
+        print("No intersection directories with images found")
+        return
+
+    start_time = time.time()
+    with IntersectionScheduler(workers=args.workers, threads_per_worker=args.threads,
+                               model_size=args.model, confidence=args.conf,
+                               backend=args.backend) as scheduler:
+        results = scheduler.process_intersections(intersections, save_output=args.save_visuals)
+    elapsed = time.time() - start_time
+
+    lanes = sum(len(lane_images) for lane_images in intersections.values())
+    print(f"Processed {lanes} lanes from {len(intersections)} intersections in {elapsed:.2f}s")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results exported to {args.output}")
+
+    if args.publish:
+        # One bulk request for all intersections instead of one per intersection
+        records = [counts_to_record(result["vehicle_counts"], intersection)
+                   for intersection, result in results.items()]
+        with CountsPublisher(args.publish) as publisher:
+            statuses = publisher.publish(records)
+        applied = sum(1 for status in statuses if status["status"] == "success")
+        print(f"Published counts for {applied} of {len(records)} intersections to {args.publish}")
+        for status in statuses:
+            if status["status"] != "success":
+                print(f"  {records[status['index']].get('intersection')}: {status['message']}")
+
+
+if __name__ == "__main__":
+    main()
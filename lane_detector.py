@@ -1,6 +1,8 @@
 # Lane-specific vehicle detection script
+import json
 import os
 from pathlib import Path
+from result_cache import ResultCache
 from vehicle_detector import VehicleDetector, export_json
 
 def main_lane_processing():
@@ -14,13 +16,30 @@ def main_lane_processing():
         "West": os.path.join(input_dir, "west.jpg")
     }
     
+    # Optional per-lane regions of interest, e.g.
+    # {"North": {"rect": [0, 200, 1280, 720], "polygon": [[100, 720], [600, 200], ...]}}
+    lane_rois = None
+    rois_path = os.path.join(input_dir, "lane_rois.json")
+    if os.path.exists(rois_path):
+        with open(rois_path) as f:
+            lane_rois = json.load(f)
+    
     # Verify images exist
     for lane, image_path in lane_images.items():
         if not os.path.exists(image_path):
             print(f"Warning: Image for {lane} lane not found at {image_path}")
     
-    # Initialize detector (using nano model for speed)
-    detector = VehicleDetector(model_size="n", confidence=0.25)
+    # Use the long-lived detector service if one is configured, so the model
+    # isn't reloaded on every run
+    service = os.environ.get("DETECTOR_SERVICE")
+    if service:
+        from detector_service import DetectorClient, parse_address
+        detector = DetectorClient(*parse_address(service))
+    else:
+        # Initialize detector (using nano model for speed)
+        # Unchanged lane images are served from the on-disk result cache
+        detector = VehicleDetector(model_size="n", confidence=0.25, lane_rois=lane_rois,
+                                   result_cache=ResultCache(disk_dir=os.path.join("cache", "detections")))
     
     # Process lanes
     print("Processing lane images...")
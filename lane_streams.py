@@ -0,0 +1,316 @@
+# Live lane streams: latest-frame capture threads and fixed-cadence counting with continuous publishing
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from backend_client import counts_to_record
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+
+
+def parse_sources(spec):
+    """
+    Parse the lane streams given on the command line
+
+    Args:
+        spec (str): JSON file mapping lane names to sources, or comma-separated
+            lane=source pairs (e.g. "north=rtsp://cam1/live,south=0,east=clip.mp4")
+
+    Returns:
+        dict: Lane name -> source (URL, file path or camera index)
+    """
+    if spec.endswith(".json"):
+        with open(spec) as f:
+            return json.load(f)
+
+    sources = {}
+    for pair in spec.split(","):
+        lane, sep, source = pair.partition("=")
+        if not sep or not lane.strip() or not source.strip():
+            raise ValueError(f"Expected lane=source, got '{pair}'")
+        sources[lane.strip()] = source.strip()
+    return sources
+
+
+class LatestFrameCapture:
+    """
+    Reads one stream on its own thread, keeping only the most recent frame
+
+    The reader never waits for inference: a frame that is replaced before
+    anyone took it counts as dropped. A local video file stands in for a
+    live camera by playing at its own frame rate and looping; a live source
+    that fails is reopened.
+    """
+
+    def __init__(self, source, reconnect_delay=1.0):
+        """
+        Args:
+            source: Stream URL, video file path or camera index
+            reconnect_delay (float): Seconds to wait before reopening a failed live stream
+        """
+        self.source = int(source) if str(source).isdigit() else source
+        self.is_file = isinstance(self.source, str) and os.path.isfile(self.source)
+        self.reconnect_delay = reconnect_delay
+
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            raise ValueError(f"Could not open stream {source}")
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_period = 1.0 / fps if self.is_file and fps > 0 else 0.0
+
+        self.lock = threading.Lock()
+        self.frame = None
+        self.captured_at = None
+        self.taken = True
+        self.captured = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        next_frame = time.monotonic()
+        while self.running:
+            ret, frame = self.cap.read()
+            if not ret:
+                if self.is_file and self.captured:
+                    # Loop the recording
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                if self.is_file:
+                    break
+                # Live stream dropped: reopen it
+                self.cap.release()
+                time.sleep(self.reconnect_delay)
+                self.cap = cv2.VideoCapture(self.source)
+                self.reconnects += 1
+                continue
+
+            captured_at = time.monotonic()
+            with self.lock:
+                if not self.taken:
+                    self.dropped += 1
+                self.frame, self.captured_at, self.taken = frame, captured_at, False
+                self.captured += 1
+
+            # Pace files like a camera would deliver them
+            if self.frame_period:
+                next_frame += self.frame_period
+                delay = next_frame - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame = time.monotonic()
+
+        self.cap.release()
+
+    def latest(self):
+        """
+        Take the newest frame
+
+        Returns:
+            tuple: (frame, monotonic capture time), or (None, None) if no frame
+                arrived since the last call
+        """
+        with self.lock:
+            if self.taken:
+                return None, None
+            self.taken = True
+            return self.frame, self.captured_at
+
+    def close(self):
+        """Stop reading and release the stream"""
+        self.running = False
+        self.thread.join(timeout=5)
+
+
+class StreamCounter:
+    """
+    Counts vehicles in live lane streams on a fixed cadence
+
+    Every lane is sampled once per interval; the lanes that are due together
+    share one forward pass. The rolling mean of each lane's last counts is
+    handed to a publishing thread after every pass; only the newest counts
+    wait to be sent, so a slow backend never holds up counting.
+    """
+
+    def __init__(self, detector, sources, interval=1.0, window=5, publisher=None, intersection=None):
+        """
+        Args:
+            detector (VehicleDetector): Detector used for every lane
+            sources (dict): Lane name -> stream source (see LatestFrameCapture)
+            interval: Seconds between inferences, for all lanes or as a {lane: seconds} dict
+            window (int): Counts averaged into each lane's rolling count
+            publisher (CountsPublisher): Pushes rolling counts to the backend (None to skip)
+            intersection (str): Intersection ID the counts are published for
+        """
+        self.detector = detector
+        self.publisher = publisher
+        self.intersection = intersection
+        self.intervals = {
+            lane: interval.get(lane, 1.0) if isinstance(interval, dict) else interval
+            for lane in sources
+        }
+
+        # One-slot mailbox for the publishing thread: newer counts replace unsent ones
+        self.publish_condition = threading.Condition()
+        self.pending_record = None
+        self.publishing = publisher is not None
+        self.publish_thread = None
+        self.publishes_superseded = 0
+        self.publish_errors = 0
+        self.backend_down = False
+
+        self.captures = {}
+        try:
+            for lane, source in sources.items():
+                self.captures[lane] = LatestFrameCapture(source)
+        except Exception:
+            self.close()
+            raise
+
+        self.counts = {lane: deque(maxlen=window) for lane in sources}
+        # Capture-to-count seconds of recent inferences
+        self.latencies = {lane: deque(maxlen=1000) for lane in sources}
+        self.processed = {lane: 0 for lane in sources}
+        self.no_new_frame = {lane: 0 for lane in sources}
+
+        if publisher is not None:
+            self.publish_thread = threading.Thread(target=self._publish_loop, daemon=True)
+            self.publish_thread.start()
+
+    def run(self, duration=None, report_every=10.0):
+        """
+        Count until duration has passed (or forever)
+
+        Args:
+            duration (float): Seconds to run (None runs until interrupted)
+            report_every (float): Seconds between status lines (0 disables them)
+        """
+        start = time.monotonic()
+        next_due = {lane: start for lane in self.captures}
+        next_report = start + report_every
+
+        while duration is None or time.monotonic() - start < duration:
+            now = time.monotonic()
+            due = [lane for lane, at in next_due.items() if at <= now]
+            if not due:
+                time.sleep(min(next_due.values()) - now)
+                continue
+
+            frames, lanes, captured = [], [], []
+            for lane in due:
+                # Keep the cadence fixed; ticks missed while busy are skipped, not queued
+                next_due[lane] += self.intervals[lane]
+                if next_due[lane] <= now:
+                    next_due[lane] = now + self.intervals[lane]
+
+                frame, captured_at = self.captures[lane].latest()
+                if frame is None:
+                    self.no_new_frame[lane] += 1
+                    continue
+                frames.append(frame)
+                lanes.append(lane)
+                captured.append(captured_at)
+
+            if frames:
+                results = self.detector.detect_frames(frames, lanes)
+                counted_at = time.monotonic()
+                for lane, result, captured_at in zip(lanes, results, captured):
+                    self.counts[lane].append(result["total_count"])
+                    self.latencies[lane].append(counted_at - captured_at)
+                    self.processed[lane] += 1
+                self._publish()
+
+            if report_every and now >= next_report:
+                next_report = now + report_every
+                print(" | ".join(f"{lane}: {count}" for lane, count in self.rolling_counts().items()))
+
+    def rolling_counts(self):
+        """Lane name -> mean of its recent counts (lanes without counts yet are left out)"""
+        return {lane: int(round(sum(counts) / len(counts)))
+                for lane, counts in self.counts.items() if counts}
+
+    def _publish(self):
+        """Hand the current rolling counts to the publishing thread (never blocks on the network)"""
+        if self.publish_thread is None:
+            return
+        record = counts_to_record(self.rolling_counts(), self.intersection, time.time())
+        with self.publish_condition:
+            if self.pending_record is not None:
+                self.publishes_superseded += 1
+            self.pending_record = record
+            self.publish_condition.notify()
+
+    def _publish_loop(self):
+        while True:
+            with self.publish_condition:
+                while self.pending_record is None and self.publishing:
+                    self.publish_condition.wait()
+                record, self.pending_record = self.pending_record, None
+            if record is None:
+                # Stopped and nothing left to send
+                return
+            self._send(record)
+
+    def _send(self, record):
+        try:
+            for result in self.publisher.publish([record]):
+                if result["status"] != "success":
+                    print(f"Backend: {result['status']} - {result['message']}")
+        except Exception as e:
+            # Keep counting while the backend is unavailable, reporting each outage once
+            if not self.backend_down:
+                print(f"Backend: error - {e}")
+            self.backend_down = True
+            self.publish_errors += 1
+            return
+        self.backend_down = False
+
+    def stats(self):
+        """
+        Per-lane stream statistics
+
+        Returns:
+            dict: Lane name -> captured/processed/dropped frames, intervals without a
+                new frame, reconnects and capture-to-count latency percentiles
+        """
+        stats = {}
+        for lane, capture in self.captures.items():
+            latencies = np.array(self.latencies[lane]) * 1000
+            stats[lane] = {
+                "frames_captured": capture.captured,
+                "frames_processed": self.processed[lane],
+                "frames_dropped": capture.dropped,
+                "no_new_frame": self.no_new_frame[lane],
+                "reconnects": capture.reconnects,
+                "latency_ms": {
+                    "p50": round(float(np.percentile(latencies, 50)), 1),
+                    "p95": round(float(np.percentile(latencies, 95)), 1),
+                    "max": round(float(latencies.max()), 1)
+                } if len(latencies) else None
+            }
+        return stats
+
+    def close(self, publish_timeout=5.0):
+        """
+        Stop every capture thread and the publishing thread
+
+        Args:
+            publish_timeout (float): Seconds to wait for the last counts to be sent
+        """
+        for capture in self.captures.values():
+            capture.close()
+
+        if self.publish_thread is not None:
+            with self.publish_condition:
+                self.publishing = False
+                self.publish_condition.notify()
+            self.publish_thread.join(timeout=publish_timeout)
@@ -0,0 +1,35 @@
+# Deferred imports of heavy modules, so importing this package stays fast
+import importlib
+import types
+
+# Modules that must not be loaded just by importing the detector (checked by benchmark.py startup)
+HEAVY_MODULES = ("ultralytics", "torch", "cv2")
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is only imported on first attribute access
+
+    After the import the real module's attributes are copied onto the
+    stand-in, so later lookups are plain attribute reads. The import
+    system's own locking makes concurrent first accesses safe.
+    """
+
+    def __getattr__(self, name):
+        # Only reached for attributes that haven't been copied over yet
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, name)
+
+
+def lazy_import(name):
+    """
+    Return a module that is imported the first time one of its attributes is used
+
+    Args:
+        name (str): Module name, e.g. "cv2"
+
+    Returns:
+        LazyModule: Module stand-in
+    """
+    return LazyModule(name)
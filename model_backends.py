@@ -0,0 +1,203 @@
+# Model loading for the different inference backends (PyTorch, ONNX Runtime, OpenVINO)
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# Precisions supported by each backend on CPU
+BACKENDS = {
+    "torch": ("fp32",),
+    "onnx": ("fp32", "int8"),
+    "openvino": ("fp32", "fp16", "int8")
+}
+
+DEFAULT_CACHE_DIR = "models"
+DEFAULT_CALIBRATION_DIR = "images"
+
+
+def load_model(model_size="n", backend="torch", imgsz=640, precision="fp32",
+               cache_dir=DEFAULT_CACHE_DIR, calibration_images=None):
+    """
+    Load a YOLOv8 model for the requested backend, exporting it on first use
+
+    Exported models are cached on disk, keyed by model size, input
+    resolution and precision, so the export only ever runs once.
+
+    Args:
+        model_size (str): Size of YOLOv8 model ('n', 's', 'm', 'l', 'x')
+        backend (str): 'torch', 'onnx' or 'openvino'
+        imgsz (int): Square input resolution the model is exported for
+        precision (str): 'fp32', 'fp16' or 'int8' (see BACKENDS)
+        cache_dir (str): Directory holding exported models
+        calibration_images (list): Image paths used for INT8 calibration
+            (defaults to the lane shots in images/)
+
+    Returns:
+        YOLO: Model that can be called exactly like the PyTorch one
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {list(BACKENDS)}")
+    if precision not in BACKENDS[backend]:
+        raise ValueError(f"Backend '{backend}' supports {list(BACKENDS[backend])}, not '{precision}'")
+
+    # Ultralytics (and torch with it) is only imported once a model is actually loaded
+    from ultralytics import YOLO
+
+    weights = f"yolov8{model_size}.pt"
+    if backend == "torch":
+        return YOLO(weights)
+
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    artifact = cache_dir / _artifact_name(model_size, backend, imgsz, precision)
+
+    if not artifact.exists():
+        if calibration_images is None:
+            calibration_images = find_calibration_images()
+        if backend == "onnx":
+            _export_onnx(model_size, imgsz, precision, cache_dir, calibration_images)
+        else:
+            _export_openvino(model_size, imgsz, precision, cache_dir, calibration_images)
+
+    return YOLO(str(artifact), task="detect")
+
+
+def find_calibration_images(directory=DEFAULT_CALIBRATION_DIR):
+    """Return the image files in a directory, sorted by name"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, f) for f in os.listdir(directory)
+        if f.lower().endswith(('.jpg', '.jpeg', '.png'))
+    )
+
+
+def _artifact_name(model_size, backend, imgsz, precision):
+    """File (or directory) name of a cached export"""
+    stem = f"yolov8{model_size}_{imgsz}_{precision}"
+    if backend == "onnx":
+        return f"{stem}.onnx"
+    # Ultralytics recognises OpenVINO models by this directory suffix
+    return f"{stem}_openvino_model"
+
+
+def _export_onnx(model_size, imgsz, precision, cache_dir, calibration_images):
+    """Export to ONNX, statically quantizing to INT8 if requested"""
+    artifact = cache_dir / _artifact_name(model_size, "onnx", imgsz, precision)
+
+    if precision == "int8":
+        fp32_artifact = cache_dir / _artifact_name(model_size, "onnx", imgsz, "fp32")
+        if not fp32_artifact.exists():
+            _export_onnx(model_size, imgsz, "fp32", cache_dir, calibration_images)
+        _quantize_onnx(fp32_artifact, artifact, imgsz, calibration_images)
+        return
+
+    from ultralytics import YOLO
+
+    # Dynamic axes keep batched lane inference working
+    exported = YOLO(f"yolov8{model_size}.pt").export(format="onnx", imgsz=imgsz, dynamic=True)
+    shutil.move(str(exported), str(artifact))
+
+
+def _export_openvino(model_size, imgsz, precision, cache_dir, calibration_images):
+    """Export to OpenVINO IR, using the calibration images for INT8"""
+    from ultralytics import YOLO
+
+    weights = f"yolov8{model_size}.pt"
+    artifact = cache_dir / _artifact_name(model_size, "openvino", imgsz, precision)
+    options = {"format": "openvino", "imgsz": imgsz, "dynamic": True,
+               "half": precision == "fp16", "int8": precision == "int8"}
+
+    if precision == "int8":
+        options["data"] = str(_write_calibration_dataset(weights, cache_dir, calibration_images))
+
+    exported = YOLO(weights).export(**options)
+    shutil.move(str(exported), str(artifact))
+
+
+def _write_calibration_dataset(weights, cache_dir, calibration_images):
+    """Write a dataset YAML that points Ultralytics at the calibration images"""
+    from ultralytics import YOLO
+
+    if not calibration_images:
+        raise ValueError("INT8 export needs calibration images (none found in images/)")
+
+    # Mirror the calibration images into their own folder so only they are used
+    image_dir = cache_dir / "calibration" / "images"
+    image_dir.mkdir(parents=True, exist_ok=True)
+    for path in calibration_images:
+        shutil.copy(path, image_dir / Path(path).name)
+
+    names = YOLO(weights).names
+    dataset = {
+        "path": str(image_dir.parent.resolve()),
+        "train": "images",
+        "val": "images",
+        "names": [names[i] for i in sorted(names)]
+    }
+
+    # JSON is valid YAML, so no YAML writer is needed
+    dataset_path = cache_dir / "calibration" / "dataset.yaml"
+    with open(dataset_path, 'w') as f:
+        json.dump(dataset, f, indent=2)
+    return dataset_path
+
+
+def _quantize_onnx(fp32_artifact, artifact, imgsz, calibration_images):
+    """Statically quantize an ONNX model to INT8 with ONNX Runtime"""
+    import onnxruntime
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    if not calibration_images:
+        raise ValueError("INT8 quantization needs calibration images (none found in images/)")
+
+    input_name = onnxruntime.InferenceSession(
+        str(fp32_artifact), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class ImageCalibrationReader(CalibrationDataReader):
+        """Feeds letterboxed calibration images to the quantizer one at a time"""
+
+        def __init__(self):
+            self.images = iter(calibration_images)
+
+        def get_next(self):
+            for path in self.images:
+                img = cv2.imread(path)
+                if img is not None:
+                    return {input_name: letterbox_tensor(img, imgsz)}
+            return None
+
+    quantize_static(str(fp32_artifact), str(artifact), ImageCalibrationReader(),
+                    quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8)
+
+
+def letterbox_tensor(img, imgsz):
+    """
+    Resize and pad an image the way YOLO preprocessing does
+
+    Args:
+        img (numpy.ndarray): BGR image
+        imgsz (int): Square output size
+
+    Returns:
+        numpy.ndarray: (1, 3, imgsz, imgsz) float32 RGB tensor scaled to [0, 1]
+    """
+    height, width = img.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return tensor[None]
@@ -0,0 +1,256 @@
+# Background pool that renders annotations and encodes images/videos off the detection hot path
+import queue
+import threading
+
+from lazy_imports import lazy_import
+from pipeline_metrics import no_timing
+
+cv2 = lazy_import("cv2")
+
+# What to do when the queue is full
+POLICIES = ("block", "drop_oldest", "drop_newest")
+
+# Marks the end of a queue
+_STOP = object()
+
+
+class _BoundedQueue:
+    """Bounded job queue applying a full-queue policy and counting dropped jobs"""
+
+    def __init__(self, maxsize, policy):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}' (choose from {', '.join(POLICIES)})")
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.policy = policy
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def offer(self, job):
+        """
+        Queue a job according to the policy
+
+        Returns:
+            bool: False if the job itself was dropped
+        """
+        if self.policy == "block":
+            self.queue.put(job)
+            return True
+
+        while True:
+            try:
+                self.queue.put_nowait(job)
+                return True
+            except queue.Full:
+                if self.policy == "drop_newest":
+                    with self.lock:
+                        self.dropped += 1
+                    return False
+                # Make room by discarding the oldest waiting job
+                try:
+                    self.queue.get_nowait()
+                    self.queue.task_done()
+                    with self.lock:
+                        self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def close(self, consumers=1):
+        """Wake every consumer up with a stop marker (never dropped)"""
+        for _ in range(consumers):
+            self.queue.put(_STOP)
+
+
+class OutputWriter:
+    """
+    Pool of writer threads for annotated images and videos
+
+    Detection only hands over the frame and a render function; drawing the
+    boxes and the JPEG/MP4 encoding happen on the writer threads. OpenCV
+    releases the GIL while encoding, so the writers run in parallel with
+    inference.
+    """
+
+    def __init__(self, workers=2, queue_size=32, policy="block", jpeg_quality=95, sample_every=1,
+                 metrics=None):
+        """
+        Initialize the writer pool and start its threads
+
+        Args:
+            workers (int): Threads writing images
+            queue_size (int): Maximum jobs waiting per queue
+            policy (str): Full-queue behaviour: 'block' (backpressure), 'drop_oldest'
+                or 'drop_newest'
+            jpeg_quality (int): JPEG quality of written images (0-100)
+            sample_every (int): Only write every nth image
+            metrics (StageMetrics): Collector for the write stage timings (render
+                functions time their own annotation)
+        """
+        self.workers = workers
+        self.queue_size = queue_size
+        self.policy = policy
+        self.jpeg_quality = jpeg_quality
+        self.sample_every = max(1, sample_every)
+        self._time = metrics.time if metrics is not None else no_timing
+
+        self.jobs = _BoundedQueue(queue_size, policy)
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.skipped = 0
+        self.errors = []
+        # Videos still open; released ones are folded into the totals below
+        self.videos = []
+        self.video_frames_written = 0
+        self.video_frames_dropped = 0
+        self.video_errors = []
+
+        self.threads = [threading.Thread(target=self._image_worker, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def write_image(self, path, image, render=None):
+        """
+        Queue an image to be rendered and written
+
+        Args:
+            path (str): Output file
+            image (numpy.ndarray): Frame to write (not modified by the caller afterwards)
+            render (callable): Function drawing on the image before it is encoded
+
+        Returns:
+            bool: True if the image was queued
+        """
+        with self.lock:
+            self.submitted += 1
+            if (self.submitted - 1) % self.sample_every:
+                self.skipped += 1
+                return False
+        return self.jobs.offer((str(path), image, render))
+
+    def open_video(self, path, fps, size, fourcc="mp4v"):
+        """
+        Open a video whose frames are rendered and encoded on a dedicated thread
+
+        Returns:
+            VideoOutput: Writer with the cv2.VideoWriter write/release interface
+        """
+        video = VideoOutput(path, fps, size, fourcc, self.queue_size, self.policy, self._time,
+                            lock=self.lock, on_release=self._video_released)
+        with self.lock:
+            self.videos.append(video)
+        return video
+
+    def _video_released(self, video):
+        """Move a released video's counters into the totals and drop the reference"""
+        with self.lock:
+            if video in self.videos:
+                self.videos.remove(video)
+                self.video_frames_written += video.written
+                self.video_frames_dropped += video.frames.dropped
+                self.video_errors.extend(video.errors)
+
+    def _image_worker(self):
+        while True:
+            job = self.jobs.queue.get()
+            try:
+                if job is _STOP:
+                    return
+                path, image, render = job
+                if render is not None:
+                    image = render(image)
+                with self._time("write"):
+                    cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                with self.lock:
+                    self.written += 1
+            except Exception as e:
+                with self.lock:
+                    self.errors.append(f"{job[0]}: {e}")
+            finally:
+                self.jobs.queue.task_done()
+
+    def flush(self):
+        """Wait until every queued image has been written"""
+        self.jobs.queue.join()
+
+    def close(self):
+        """Finish all queued work, then stop the writer threads"""
+        # Releasing removes the video from the list
+        for video in list(self.videos):
+            video.release()
+        self.jobs.close(len(self.threads))
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def stats(self):
+        """
+        Report what the pool wrote and dropped
+
+        Returns:
+            dict: Image counters plus frames written/dropped across videos
+        """
+        with self.lock:
+            return {
+                "images_written": self.written,
+                "images_dropped": self.jobs.dropped,
+                "images_skipped": self.skipped,
+                "video_frames_written": self.video_frames_written + sum(video.written for video in self.videos),
+                "video_frames_dropped": self.video_frames_dropped + sum(video.frames.dropped for video in self.videos),
+                "errors": list(self.errors) + self.video_errors + [e for video in self.videos for e in video.errors]
+            }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class VideoOutput:
+    """Video file written in frame order by its own thread (see OutputWriter.open_video)"""
+
+    def __init__(self, path, fps, size, fourcc, queue_size, policy, timer=no_timing, lock=None, on_release=None):
+        self.writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        self.frames = _BoundedQueue(queue_size, policy)
+        self._time = timer
+        # Guards the counters (the owning pool's lock, so its stats read them consistently)
+        self.lock = lock or threading.Lock()
+        self.on_release = on_release
+        self.written = 0
+        self.errors = []
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+
+    def write(self, frame, render=None):
+        """Queue a frame, optionally with a function that draws on it before encoding"""
+        return self.frames.offer((frame, render))
+
+    def _worker(self):
+        while True:
+            job = self.frames.queue.get()
+            try:
+                if job is _STOP:
+                    return
+                frame, render = job
+                if render is not None:
+                    frame = render(frame)
+                with self._time("write"):
+                    self.writer.write(frame)
+                with self.lock:
+                    self.written += 1
+            except Exception as e:
+                with self.lock:
+                    self.errors.append(str(e))
+            finally:
+                self.frames.queue.task_done()
+
+    def release(self):
+        """Encode the remaining frames and close the file"""
+        if self.thread is None:
+            return
+        self.frames.close()
+        self.thread.join()
+        self.thread = None
+        self.writer.release()
+        if self.on_release is not None:
+            self.on_release(self)
@@ -0,0 +1,158 @@
+# Stage-level timing metrics for the detection pipeline, exportable in Prometheus text format
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# Pipeline stages in the order a frame passes through them
+STAGES = ("decode", "preprocess", "infer", "nms", "postprocess", "annotate", "write")
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Shared context manager handed out when metrics are disabled
+_NO_TIMING = nullcontext()
+
+
+def no_timing(stage):
+    """Stand-in for StageMetrics.time when metrics are off (no clock reads, no allocation)"""
+    return _NO_TIMING
+
+
+class StageMetrics:
+    """
+    Per-stage latency histograms plus a window of recent samples for percentiles
+
+    All methods are thread-safe, so the pipelined video engine's stages can
+    record into the same instance.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=2048):
+        """
+        Initialize the metrics
+
+        Args:
+            buckets (tuple): Histogram bucket upper bounds in seconds
+            window (int): Recent samples kept per stage for p50/p95/p99
+        """
+        self.buckets = tuple(buckets)
+        self.window = window
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def _stage(self, stage):
+        """Get (or create) a stage's counters (lock held)"""
+        data = self.stages.get(stage)
+        if data is None:
+            data = self.stages[stage] = {
+                "bucket_counts": [0] * len(self.buckets),
+                "count": 0,
+                "sum": 0.0,
+                "recent": deque(maxlen=self.window)
+            }
+        return data
+
+    def observe(self, stage, seconds):
+        """Record one duration for a stage"""
+        with self.lock:
+            data = self._stage(stage)
+            data["count"] += 1
+            data["sum"] += seconds
+            data["recent"].append(seconds)
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    data["bucket_counts"][index] += 1
+                    break
+
+    @contextmanager
+    def time(self, stage):
+        """Context manager that records the duration of its block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def reset(self):
+        """Drop every recorded sample"""
+        with self.lock:
+            self.stages.clear()
+
+    def summary(self):
+        """
+        Summarize every stage
+
+        Returns:
+            dict: Stage -> count, mean and p50/p95/p99 latency in milliseconds
+        """
+        with self.lock:
+            snapshot = {stage: (data["count"], data["sum"], sorted(data["recent"]))
+                        for stage, data in self.stages.items()}
+
+        report = {}
+        for stage in _ordered(snapshot):
+            count, total, recent = snapshot[stage]
+            report[stage] = {
+                "count": count,
+                "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+                "p50_ms": round(_percentile(recent, 50) * 1000, 3),
+                "p95_ms": round(_percentile(recent, 95) * 1000, 3),
+                "p99_ms": round(_percentile(recent, 99) * 1000, 3)
+            }
+        return report
+
+    def prometheus_text(self, prefix="detector"):
+        """
+        Render the metrics in the Prometheus text exposition format
+
+        Returns:
+            str: A histogram of stage durations and a summary with p50/p95/p99
+        """
+        with self.lock:
+            snapshot = {stage: (list(data["bucket_counts"]), data["count"], data["sum"], sorted(data["recent"]))
+                        for stage, data in self.stages.items()}
+
+        histogram = f"{prefix}_stage_duration_seconds"
+        quantiles = f"{prefix}_stage_latency_seconds"
+        lines = [
+            f"# HELP {histogram} Time spent in each detection pipeline stage.",
+            f"# TYPE {histogram} histogram"
+        ]
+        for stage in _ordered(snapshot):
+            bucket_counts, count, total, _ = snapshot[stage]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{histogram}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{histogram}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{histogram}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{histogram}_count{{stage="{stage}"}} {count}')
+
+        lines.append(f"# HELP {quantiles} Recent per-stage latency quantiles.")
+        lines.append(f"# TYPE {quantiles} summary")
+        for stage in _ordered(snapshot):
+            _, count, total, recent = snapshot[stage]
+            for q in (50, 95, 99):
+                lines.append(f'{quantiles}{{stage="{stage}",quantile="{q / 100}"}} {_percentile(recent, q)}')
+            lines.append(f'{quantiles}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{quantiles}_count{{stage="{stage}"}} {count}')
+
+        return "\n".join(lines) + "\n"
+
+
+def _ordered(stages):
+    """Known stages in pipeline order, then any others alphabetically"""
+    return [s for s in STAGES if s in stages] + sorted(s for s in stages if s not in STAGES)
+
+
+def _percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list (0.0 when empty)"""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values), max(1, math.ceil(q / 100 * len(sorted_values)))) - 1
+    return sorted_values[rank]
+
+
+# Process-wide metrics shared by the CLI and the Flask /metrics route
+default_metrics = StageMetrics()
@@ -0,0 +1,144 @@
+# Content-addressed cache of detection results for repeated lane images
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+def content_key(data, fingerprint=""):
+    """
+    Hash image bytes together with the settings that affect detection
+
+    Args:
+        data (bytes): Encoded image bytes
+        fingerprint (str): Detector settings (model, confidence, backend, ...)
+
+    Returns:
+        str: Hex digest used as the cache key
+    """
+    digest = hashlib.blake2b(data, digest_size=16)
+    digest.update(fingerprint.encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of detection record arrays keyed by content hash
+
+    The memory tier is an LRU bounded by the total size of the cached
+    arrays. The optional disk tier stores one .npy file per key, so results
+    survive restarts and are shared between processes.
+    """
+
+    # Rough per-entry bookkeeping cost on top of the array itself
+    ENTRY_OVERHEAD = 256
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None):
+        """
+        Initialize the cache
+
+        Args:
+            max_bytes (int): Memory budget for the in-memory tier
+            disk_dir (str): Directory for the on-disk tier (None keeps the cache in memory only)
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Look up a cached detection array
+
+        Returns:
+            numpy.ndarray: Copy of the cached records, or None on a miss
+        """
+        with self.lock:
+            array = self.entries.get(key)
+            if array is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return array.copy()
+
+        array = self._load(key)
+        with self.lock:
+            if array is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, array)
+        return array.copy()
+
+    def put(self, key, array):
+        """Store a detection record array under key in both tiers"""
+        array = array.copy()
+        with self.lock:
+            self._remember(key, array)
+        self._store(key, array)
+
+    def stats(self):
+        """
+        Report cache effectiveness
+
+        Returns:
+            dict: Hit/miss counters, hit rate and memory use
+        """
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.current_bytes
+            }
+
+    def _remember(self, key, array):
+        """Insert into the memory tier and evict least recently used entries (lock held)"""
+        if key in self.entries:
+            self.current_bytes -= self.entries.pop(key).nbytes + self.ENTRY_OVERHEAD
+
+        self.entries[key] = array
+        self.current_bytes += array.nbytes + self.ENTRY_OVERHEAD
+
+        while self.current_bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.current_bytes -= evicted.nbytes + self.ENTRY_OVERHEAD
+            self.evictions += 1
+
+    def _path(self, key):
+        return self.disk_dir / key[:2] / f"{key}.npy"
+
+    def _load(self, key):
+        """Read an entry from the disk tier (None if absent or unreadable)"""
+        if self.disk_dir is None:
+            return None
+        try:
+            return np.load(self._path(key), allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, key, array):
+        """Write an entry to the disk tier atomically"""
+        if self.disk_dir is None:
+            return
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array, allow_pickle=False)
+        os.replace(tmp_path, path)
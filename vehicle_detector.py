@@ -1,23 +1,312 @@
-from ultralytics import YOLO
-import cv2
 import numpy as np
 import json
 import os
+import queue
+import threading
 from pathlib import Path
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from multiprocessing import get_context
+from backend_client import DEFAULT_BACKEND_URL, DIRECTIONS, CountsPublisher, counts_to_record
+from lane_streams import StreamCounter, parse_sources
+from lazy_imports import lazy_import
+from model_backends import load_model
+from output_writer import POLICIES, OutputWriter
+from pipeline_metrics import default_metrics, no_timing
+from result_cache import ResultCache, content_key
+from video_segments import SegmentLog, find_keyframes, init_worker, plan_segments, process_segment, stitch_tracks
+from vehicle_tracker import VehicleTracker
+
+# OpenCV is only imported once images are actually read or written
+cv2 = lazy_import("cv2")
+
+# Vehicle types reported by the detector, in count order
+VEHICLE_TYPES = ("car", "motorcycle", "bus", "truck")
+
+# Compact per-detection record: vehicle type index, integer box and confidence
+DETECTION_DTYPE = np.dtype([
+    ("type", np.int8),
+    ("box", np.int32, (4,)),
+    ("conf", np.float32)
+])
+
+
+def _to_numpy(values):
+    """Move a tensor (or array-like) to a NumPy array with a single device sync"""
+    if hasattr(values, "cpu"):
+        return values.cpu().numpy()
+    return np.asarray(values)
+
+
+def _tile_origins(x0, y0, x1, y1, tile_size, overlap):
+    """Top-left corners of overlapping tiles that cover the region (x0, y0)-(x1, y1)"""
+    step = max(1, int(tile_size * (1 - overlap)))
+    
+    def starts(lo, hi):
+        if hi - lo <= tile_size:
+            return [lo]
+        positions = list(range(lo, hi - tile_size, step))
+        # Last tile is flush with the far edge
+        positions.append(hi - tile_size)
+        return positions
+    
+    return [(tx, ty) for ty in starts(y0, y1) for tx in starts(x0, x1)]
+
+
+def _parse_roi(roi):
+    """
+    Normalize a region of interest
+    
+    Args:
+        roi: (x1, y1, x2, y2) rectangle, or a dict with an optional "rect" and an
+            optional "polygon" list of (x, y) points
+            
+    Returns:
+        tuple: ((x1, y1, x2, y2) rectangle, polygon array or None)
+    """
+    if not isinstance(roi, dict):
+        return tuple(roi), None
+    
+    polygon = None
+    if roi.get("polygon") is not None:
+        polygon = np.asarray(roi["polygon"], dtype=np.float64).reshape(-1, 2)
+    
+    rect = roi.get("rect")
+    if rect is None:
+        if polygon is None:
+            raise ValueError("Region of interest needs a 'rect' or a 'polygon'")
+        # Bounding rectangle of the polygon
+        rect = (*polygon.min(axis=0), *polygon.max(axis=0))
+    
+    return tuple(rect), polygon
+
+
+def _points_in_polygon(points, polygon):
+    """
+    Vectorized even-odd ray casting test
+    
+    Args:
+        points (numpy.ndarray): (N, 2) points
+        polygon (numpy.ndarray): (M, 2) polygon vertices
+        
+    Returns:
+        numpy.ndarray: (N,) boolean mask of points inside the polygon
+    """
+    if not len(points):
+        return np.zeros(0, dtype=bool)
+    
+    x, y = points[:, 0:1], points[:, 1:2]
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    
+    # Edges that straddle the point's horizontal line, crossed to the right of the point
+    straddles = (y1 > y) != (y2 > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crossing_x = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    crossings = straddles & (x < crossing_x)
+    
+    return np.count_nonzero(crossings, axis=1) % 2 == 1
+
+
+def _merge_detections(detections, overlap_threshold=0.5):
+    """
+    Class-aware NMS over detections gathered from overlapping tiles
+    
+    Overlap is measured as intersection over the smaller box, so a vehicle
+    cut in half by a tile edge is still merged into its full detection.
+    
+    Args:
+        detections (numpy.ndarray): DETECTION_DTYPE records in image coordinates
+        overlap_threshold (float): Overlap above which the lower-confidence box is dropped
+        
+    Returns:
+        numpy.ndarray: Kept records, highest confidence first
+    """
+    if len(detections) < 2:
+        return detections
+    
+    detections = detections[np.argsort(-detections["conf"], kind="stable")]
+    boxes = detections["box"].astype(np.float64)
+    
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    smaller = np.maximum(np.minimum(areas[:, None], areas[None, :]), 1e-9)
+    overlap = inter / smaller
+    overlap[detections["type"][:, None] != detections["type"][None, :]] = 0.0
+    
+    keep = np.ones(len(detections), dtype=bool)
+    for i in range(len(detections)):
+        if keep[i]:
+            keep[i + 1:] &= overlap[i, i + 1:] < overlap_threshold
+    
+    return detections[keep]
+
+
+class Detections:
+    """
+    Vehicle detections stored as a structured array
+    
+    Indexing or iterating yields the familiar {"class", "box", "conf"} dicts,
+    built lazily on access, while .array exposes the compact record array.
+    """
+    
+    __slots__ = ("array",)
+    
+    def __init__(self, array=None):
+        self.array = np.empty(0, dtype=DETECTION_DTYPE) if array is None else array
+        
+    def __len__(self):
+        return len(self.array)
+        
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Detections(self.array[index])
+        
+        row = self.array[index]
+        return {
+            "class": VEHICLE_TYPES[row["type"]],
+            "box": tuple(row["box"].tolist()),
+            "conf": float(row["conf"])
+        }
+        
+    def __iter__(self):
+        for index in range(len(self.array)):
+            yield self[index]
+            
+    def __repr__(self):
+        return f"Detections({list(self)!r})"
+        
+    @property
+    def boxes(self):
+        """(N, 4) integer boxes as x1, y1, x2, y2"""
+        return self.array["box"]
+        
+    @property
+    def types(self):
+        """Vehicle type index of each detection (see VEHICLE_TYPES)"""
+        return self.array["type"]
+        
+    def to_list(self):
+        """Materialize the detections as a list of dicts"""
+        return list(self)
+
+
+class MotionGate:
+    """Cheap change detector that decides whether a frame needs a fresh YOLO pass"""
+    
+    def __init__(self, threshold=0.02, size=(64, 36), pixel_delta=25):
+        """
+        Initialize the motion gate
+        
+        Args:
+            threshold (float): Fraction of changed pixels below which the last result is reused
+            size (tuple): Downscaled (width, height) used for frame differencing
+            pixel_delta (int): Grayscale difference for a pixel to count as changed
+        """
+        self.threshold = threshold
+        self.size = size
+        self.pixel_delta = pixel_delta
+        
+        # Downscaled frame and detection result from the last real inference
+        self.reference = None
+        self.last_result = None
+        
+        # Hits reuse the last result, misses run the model
+        self.hits = 0
+        self.misses = 0
+        
+    def check(self, frame):
+        """
+        Compare a frame with the last inferred frame
+        
+        Args:
+            frame (numpy.ndarray): BGR frame
+            
+        Returns:
+            tuple: (cached result or None, downscaled frame to pass to update)
+        """
+        small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), self.size,
+                           interpolation=cv2.INTER_AREA)
+        
+        if self.last_result is not None:
+            diff = cv2.absdiff(small, self.reference)
+            changed = np.count_nonzero(diff > self.pixel_delta) / diff.size
+            if changed < self.threshold:
+                self.hits += 1
+                return self.last_result, small
+        
+        self.misses += 1
+        return None, small
+        
+    def update(self, small, result):
+        """Remember the frame and result of a real inference"""
+        self.reference = small
+        self.last_result = result
+        
 
 class VehicleDetector:
-    def __init__(self, model_size="n", confidence=0.25):
+    def __init__(self, model_size="n", confidence=0.25, motion_threshold=None, lane_motion_thresholds=None,
+                 backend="torch", imgsz=640, precision="fp32", tile_size=None, tile_overlap=0.2,
+                 lane_rois=None, result_cache=None, metrics=None, output_writer=None):
         """
         Initialize the Vehicle Detector with YOLO model
         
         Args:
             model_size (str): Size of YOLOv8 model ('n', 's', 'm', 'l', 'x')
             confidence (float): Detection confidence threshold
+            motion_threshold (float): Changed-pixel fraction below which a lane reuses its
+                last detection result (None disables motion gating)
+            lane_motion_thresholds (dict): Per-lane overrides of motion_threshold
+                (a value of None disables gating for that lane)
+            backend (str): Inference backend ('torch', 'onnx' or 'openvino')
+            imgsz (int): Model input resolution
+            precision (str): Backend precision ('fp32', 'fp16' or 'int8')
+            tile_size (int): Slice frames into overlapping tiles of this size and run them
+                as one batch, to catch small distant vehicles (None disables tiling)
+            tile_overlap (float): Fraction of a tile shared with its neighbours
+            lane_rois (dict): Lane name -> region of interest, either an (x1, y1, x2, y2)
+                rectangle or {"rect": (x1, y1, x2, y2), "polygon": [(x, y), ...]}
+            result_cache (ResultCache): Cache of results keyed by image content and
+                detector settings (None disables caching)
+            metrics (StageMetrics): Per-stage timing collector (None disables profiling)
+            output_writer (OutputWriter): Background pool that renders and writes annotated
+                images and videos (None writes them synchronously)
         """
-        self.model = YOLO(f"yolov8{model_size}.pt")
+        self.model = load_model(model_size, backend=backend, imgsz=imgsz, precision=precision)
+        self.model_size = model_size
+        self.backend = backend
+        self.imgsz = imgsz
+        self.precision = precision
         self.confidence = confidence
         
+        # Tiled (sliced) inference configuration
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        
+        # Per-lane regions of interest (keyed like lane_images)
+        self.lane_rois = lane_rois or {}
+        
+        # Identical image files skip inference entirely
+        self.result_cache = result_cache
+        
+        # Stage timers are a shared no-op when profiling is off
+        self.metrics = metrics
+        self._time = metrics.time if metrics is not None else no_timing
+        
+        # Annotated output is rendered and encoded off the hot path when set
+        self.output_writer = output_writer
+        
+        # Motion gating configuration and one gate per lane
+        self.motion_threshold = motion_threshold
+        self.lane_motion_thresholds = lane_motion_thresholds or {}
+        self.motion_gates = {}
+        
         # COCO dataset vehicle classes (subset)
         self.vehicle_classes = [2, 3, 5, 7]  # car, motorcycle, bus, truck
         self.class_names = {
@@ -27,71 +316,53 @@ class VehicleDetector:
             7: 'truck'
         }
         
-    def detect_vehicles(self, image_path, save_output=False):
+        # Lookup table from COCO class id to index in VEHICLE_TYPES
+        self._type_lookup = np.full(max(self.class_names) + 1, -1, dtype=np.int64)
+        for cls_id, name in self.class_names.items():
+            self._type_lookup[cls_id] = VEHICLE_TYPES.index(name)
+        
+    def detect_vehicles(self, image_path, save_output=False, lane=None, tile_roi=None, roi=None, output_dir=None):
         """
         Detect and count vehicles in an image
         
         Args:
             image_path (str): Path to the image file
             save_output (bool): Whether to save annotated image
+            lane (str): Lane name used for motion gating (defaults to image_path)
+            tile_roi (tuple): (x1, y1, x2, y2) region to tile in tiled mode (None for the whole image)
+            roi: Region of interest (rectangle or {"rect", "polygon"}); defaults to the
+                lane's entry in lane_rois
+            output_dir (str): Directory for the annotated image (default: output/)
             
         Returns:
             dict: Detection results with counts and vehicle types
         """
-        # Read image
-        img = cv2.imread(image_path)
-        if img is None:
-            raise FileNotFoundError(f"Could not read image at {image_path}")
-            
-        # Store original for drawing
-        original_img = img.copy()
-        
-        # Run inference
-        results = self.model(img, conf=self.confidence)
-        
-        # Process results
-        boxes = results[0].boxes
-        
-        # Count vehicles by type
-        vehicle_counts = {
-            "car": 0,
-            "motorcycle": 0,
-            "bus": 0,
-            "truck": 0
-        }
+        lane = lane or image_path
         
-        # Detected vehicle coordinates for drawing
-        detected_vehicles = []
+        # Identical image bytes with identical settings reuse the cached result
+        key, data, summary = self._cache_lookup(image_path, lane, roi, tile_roi)
         
-        # Process each detection
-        for i in range(len(boxes)):
-            cls_id = int(boxes.cls[i].item())
+        # Read image (only needed on a cache miss or for drawing)
+        img = None
+        if summary is None or save_output:
+            img = self._decode_image(image_path, data)
             
-            # Check if detection is a vehicle
-            if cls_id in self.vehicle_classes:
-                # Get class name
-                class_name = self.class_names[cls_id]
-                
-                # Increment counter
-                vehicle_counts[class_name] += 1
-                
-                # Get bounding box and confidence
-                x1, y1, x2, y2 = boxes.xyxy[i].cpu().numpy()
-                conf = boxes.conf[i].item()
-                
-                # Store for drawing
-                detected_vehicles.append({
-                    "class": class_name,
-                    "box": (int(x1), int(y1), int(x2), int(y2)),
-                    "conf": conf
-                })
+        if summary is None:
+            # Run inference and count vehicles by type
+            gated = set()
+            summary = self._infer(img, lane, tile_roi, roi, gated=gated)
+            # A motion gate hit is an earlier image's result, not this image's
+            if key is not None and lane not in gated:
+                self.result_cache.put(key, summary[1].array)
+        
+        vehicle_counts, detected_vehicles = summary
         
         # Calculate total count
         total_count = sum(vehicle_counts.values())
         
         # Save annotated image if requested
         if save_output:
-            self._draw_detections(original_img, detected_vehicles, image_path)
+            self._draw_detections(img, detected_vehicles, image_path, output_dir)
         
         # Return detection summary
         return {
@@ -100,23 +371,300 @@ class VehicleDetector:
             "detections": detected_vehicles
         }
         
-    def process_lanes(self, lane_images, save_output=False):
+    def _cache_lookup(self, image_path, lane=None, roi=None, tile_roi=None):
+        """
+        Look an image file up in the result cache
+        
+        Args:
+            image_path (str): Path to the image file
+            lane (str): Lane name (selects the lane's region of interest)
+            roi: Explicit region of interest
+            tile_roi (tuple): Tiling region
+            
+        Returns:
+            tuple: (cache key, encoded image bytes, cached summary or None);
+                all None when caching is disabled
+        """
+        if self.result_cache is None:
+            return None, None, None
+        
+        try:
+            with open(image_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            raise FileNotFoundError(f"Could not read image at {image_path}")
+        
+        # Everything that changes the detections is part of the key
+        if roi is None:
+            roi = self.lane_rois.get(lane)
+        fingerprint = "|".join(repr(value) for value in (
+            self.model_size, self.backend, self.precision, self.imgsz, self.confidence,
+            self.tile_size, self.tile_overlap, roi, tile_roi))
+        
+        key = content_key(data, fingerprint)
+        array = self.result_cache.get(key)
+        summary = self._count_detections(array) if array is not None else None
+        return key, data, summary
+        
+    def _decode_image(self, image_path, data=None):
+        """Decode an image from already-read bytes, or from disk"""
+        with self._time("decode"):
+            if data is None:
+                img = cv2.imread(image_path)
+            else:
+                img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise FileNotFoundError(f"Could not read image at {image_path}")
+        return img
+        
+    def cache_stats(self):
+        """
+        Report result cache hits and misses
+        
+        Returns:
+            dict: Cache statistics (empty when caching is disabled)
+        """
+        return self.result_cache.stats() if self.result_cache is not None else {}
+        
+    def _infer(self, image, lane=None, tile_roi=None, roi=None, gated=None):
+        """
+        Run the model on one image, reusing the lane's last result if nothing moved
+        
+        Args:
+            image (numpy.ndarray): BGR image
+            lane (str): Lane key for motion gating and lane_rois (None disables gating)
+            tile_roi (tuple): (x1, y1, x2, y2) region to tile in tiled mode
+            roi: Region of interest overriding the lane's lane_rois entry
+            gated (set): If given, the lane is added when its motion gate answered
+            
+        Returns:
+            tuple: (vehicle_counts dict, Detections)
+        """
+        # Only the ROI's bounding rectangle is sent to the model
+        image, offset, polygon = self._crop_to_roi(image, lane, roi)
+        if tile_roi is not None:
+            tile_roi = (tile_roi[0] - offset[0], tile_roi[1] - offset[1],
+                        tile_roi[2] - offset[0], tile_roi[3] - offset[1])
+        
+        gate = self._motion_gate(lane)
+        if gate is not None:
+            cached, small = gate.check(image)
+            if cached is not None:
+                if gated is not None:
+                    gated.add(lane)
+                return self._copy_summary(cached)
+        
+        if self.tile_size:
+            summary = self._infer_tiled(image, tile_roi)
+        else:
+            results = self._predict(image)
+            summary = self._summarize_result(results[0])
+        summary = self._restore_roi(summary, offset, polygon)
+        
+        if gate is not None:
+            gate.update(small, summary)
+            return self._copy_summary(summary)
+        return summary
+        
+    def _crop_to_roi(self, image, lane=None, roi=None):
+        """
+        Crop an image to a region of interest's bounding rectangle
+        
+        Args:
+            image (numpy.ndarray): BGR image
+            lane (str): Lane whose lane_rois entry is used when roi is None
+            roi: Rectangle (x1, y1, x2, y2) or {"rect": ..., "polygon": ...}
+            
+        Returns:
+            tuple: (cropped image, (x, y) offset of the crop, polygon array or None)
+            
+        Raises:
+            ValueError: If the rectangle lies outside the frame (nothing left to detect in)
+        """
+        if roi is None:
+            roi = self.lane_rois.get(lane)
+        if roi is None:
+            return image, (0, 0), None
+        
+        rect, polygon = _parse_roi(roi)
+        height, width = image.shape[:2]
+        x0, y0 = max(0, int(rect[0])), max(0, int(rect[1]))
+        x1, y1 = min(width, int(rect[2])), min(height, int(rect[3]))
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError(f"Region of interest {list(rect)} for lane {lane} doesn't overlap "
+                             f"the {width}x{height} frame")
+        
+        return image[y0:y1, x0:x1], (x0, y0), polygon
+        
+    def _restore_roi(self, summary, offset, polygon):
+        """Shift ROI detections back to image coordinates and drop centres outside the polygon"""
+        if offset == (0, 0) and polygon is None:
+            return summary
+        
+        detections = summary[1].array.copy()
+        detections["box"] += np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.int32)
+        
+        if polygon is not None:
+            boxes = detections["box"]
+            centres = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+            detections = detections[_points_in_polygon(centres, polygon)]
+        
+        return self._count_detections(detections)
+        
+    def _infer_tiled(self, image, roi=None):
+        """
+        Detect vehicles on overlapping tiles plus one whole-region pass
+        
+        All tiles go through the model as a single batch. Tile detections are
+        shifted back to image coordinates and duplicates across tiles are
+        merged with class-aware NMS.
+        
+        Args:
+            image (numpy.ndarray): BGR image
+            roi (tuple): (x1, y1, x2, y2) region to tile (None for the whole image)
+            
+        Returns:
+            tuple: (vehicle_counts dict, Detections)
+        """
+        height, width = image.shape[:2]
+        x0, y0, x1, y1 = roi if roi is not None else (0, 0, width, height)
+        x0, y0 = max(0, int(x0)), max(0, int(y0))
+        x1, y1 = min(width, int(x1)), min(height, int(y1))
+        
+        # Whole region first (catches large vehicles), then the tiles
+        origins = [(x0, y0)]
+        crops = [image[y0:y1, x0:x1]]
+        for tx, ty in _tile_origins(x0, y0, x1, y1, self.tile_size, self.tile_overlap):
+            origins.append((tx, ty))
+            crops.append(image[ty:ty + self.tile_size, tx:tx + self.tile_size])
+        
+        results = self._predict(crops)
+        
+        parts = []
+        for (ox, oy), result in zip(origins, results):
+            _, detections = self._summarize_result(result)
+            shifted = detections.array.copy()
+            shifted["box"] += np.array([ox, oy, ox, oy], dtype=np.int32)
+            parts.append(shifted)
+        
+        merged = _merge_detections(np.concatenate(parts))
+        return self._count_detections(merged)
+        
+    def warmup(self):
+        """Run one dummy inference so the first real job doesn't pay for lazy initialization"""
+        self._predict(np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8))
+        
+    def _predict(self, source):
+        """Run the model on one image or a list of images"""
+        results = self.model(source, conf=self.confidence, imgsz=self.imgsz)
+        
+        # Ultralytics times its own preprocess/inference/NMS steps per image (in ms)
+        if self.metrics is not None:
+            for result in results:
+                speed = getattr(result, "speed", None) or {}
+                for stage, key in (("preprocess", "preprocess"), ("infer", "inference"), ("nms", "postprocess")):
+                    if speed.get(key) is not None:
+                        self.metrics.observe(stage, speed[key] / 1000)
+        
+        return results
+        
+    def _motion_gate(self, lane):
+        """Return the motion gate for a lane, creating it on first use (None if gating is off)"""
+        if lane is None:
+            return None
+        
+        threshold = self.lane_motion_thresholds.get(lane, self.motion_threshold)
+        if threshold is None:
+            return None
+        
+        gate = self.motion_gates.get(lane)
+        if gate is None:
+            gate = self.motion_gates[lane] = MotionGate(threshold)
+        return gate
+        
+    @staticmethod
+    def _copy_summary(summary):
+        """Copy a cached summary so callers can't mutate the gate's copy"""
+        vehicle_counts, detected_vehicles = summary
+        return dict(vehicle_counts), Detections(detected_vehicles.array.copy())
+        
+    def motion_stats(self):
+        """
+        Report motion gate hits and misses per lane
+        
+        Returns:
+            dict: Lane name to hit/miss counters and skipped-inference ratio
+        """
+        stats = {}
+        for lane, gate in self.motion_gates.items():
+            checks = gate.hits + gate.misses
+            stats[lane] = {
+                "hits": gate.hits,
+                "misses": gate.misses,
+                "hit_rate": round(gate.hits / checks, 3) if checks else 0.0
+            }
+        return stats
+        
+    def _summarize_result(self, result):
+        """
+        Count vehicles by type and collect their boxes from one YOLO result
+        
+        Boxes are moved to NumPy once per result and filtered with a mask,
+        instead of syncing each box's tensors individually.
+        
+        Args:
+            result: Single ultralytics Results object
+            
+        Returns:
+            tuple: (vehicle_counts dict, Detections)
+        """
+        with self._time("postprocess"):
+            boxes = result.boxes
+            cls_ids = _to_numpy(boxes.cls).astype(np.int64)
+        
+            # Map COCO class ids to vehicle type indices (-1 for non-vehicles)
+            in_range = (cls_ids >= 0) & (cls_ids < len(self._type_lookup))
+            types = np.full(len(cls_ids), -1, dtype=np.int64)
+            types[in_range] = self._type_lookup[cls_ids[in_range]]
+            mask = types >= 0
+        
+            detections = np.empty(int(mask.sum()), dtype=DETECTION_DTYPE)
+            detections["type"] = types[mask]
+            detections["box"] = _to_numpy(boxes.xyxy)[mask]
+            detections["conf"] = _to_numpy(boxes.conf)[mask]
+        
+        return self._count_detections(detections)
+        
+    @staticmethod
+    def _count_detections(detections):
+        """Count a detection record array by vehicle type"""
+        counts = np.bincount(detections["type"], minlength=len(VEHICLE_TYPES))
+        vehicle_counts = dict(zip(VEHICLE_TYPES, counts.tolist()))
+        
+        return vehicle_counts, Detections(detections)
+        
+    def process_lanes(self, lane_images, save_output=False, batch_size=None):
         """
         Process multiple lane images and return counts for each lane
         
         Args:
             lane_images (dict): Dictionary with lane names as keys and image paths as values
             save_output (bool): Whether to save annotated images
+            batch_size (int): Lanes per YOLO forward pass (None runs one pass per lane)
             
         Returns:
             dict: Results formatted for backend integration
         """
+        # Tiled mode already batches the tiles of each lane
+        if batch_size and not self.tile_size:
+            return self._process_lanes_batched(lane_images, save_output, batch_size)
+        
         results = {}
         
         # Process each lane
         for lane_name, image_path in lane_images.items():
             start_time = time.time()
-            lane_results = self.detect_vehicles(image_path, save_output)
+            lane_results = self.detect_vehicles(image_path, save_output, lane=lane_name)
             processing_time = time.time() - start_time
             
             # Store results for this lane
@@ -134,56 +682,203 @@ class VehicleDetector:
         
         return output
             
-    def _draw_detections(self, image, detections, image_path):
-        """Draw bounding boxes and labels on the image"""
-        # Color mapping for different vehicle types
-        colors = {
-            "car": (0, 255, 0),      # Green
-            "motorcycle": (0, 165, 255),  # Orange
-            "bus": (255, 0, 0),      # Blue
-            "truck": (0, 0, 255)     # Red
-        }
+    def _process_lanes_batched(self, lane_images, save_output, batch_size):
+        """
+        Process lane images in batches with one YOLO forward pass per batch
         
-        # Draw each detection
-        for det in detections:
-            # Get detection info
-            class_name = det["class"]
-            box = det["box"]
-            conf = det["conf"]
-            color = colors.get(class_name, (255, 255, 255))
+        Args:
+            lane_images (dict): Dictionary with lane names as keys and image paths as values
+            save_output (bool): Whether to save annotated images
+            batch_size (int): Maximum number of lane images per forward pass
+            
+        Returns:
+            dict: Results formatted for backend integration (same shape as process_lanes)
+        """
+        results = {}
+        lanes = list(lane_images.items())
+        
+        for start in range(0, len(lanes), batch_size):
+            batch = lanes[start:start + batch_size]
+            start_time = time.time()
             
-            # Draw bounding box
-            cv2.rectangle(image, (box[0], box[1]), (box[2], box[3]), color, 2)
+            # Check the result cache, then decode the images that are still needed
+            summaries = [None] * len(batch)
+            keys = [None] * len(batch)
+            images = [None] * len(batch)
+            for index, (lane_name, image_path) in enumerate(batch):
+                keys[index], data, summaries[index] = self._cache_lookup(image_path, lane_name)
+                if summaries[index] is None or save_output:
+                    images[index] = self._decode_image(image_path, data)
             
-            # Prepare label text
-            label = f"{class_name} {conf:.2f}"
+            # One forward pass for the lanes that missed the cache
+            misses = [index for index, summary in enumerate(summaries) if summary is None]
+            if misses:
+                gated = set()
+                inferred = self._infer_batch([images[index] for index in misses],
+                                             [batch[index][0] for index in misses], gated=gated)
+                for index, summary in zip(misses, inferred):
+                    summaries[index] = summary
+                    # Gate hits reuse an earlier image's result, so they aren't cached for this image
+                    if keys[index] is not None and batch[index][0] not in gated:
+                        self.result_cache.put(keys[index], summary[1].array)
             
-            # Draw label background
-            text_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
-            cv2.rectangle(image, (box[0], box[1] - text_size[1] - 10), 
-                         (box[0] + text_size[0], box[1]), color, -1)
+            # Each lane gets an equal share of the batch time
+            processing_time = (time.time() - start_time) / len(batch)
             
-            # Draw text
-            cv2.putText(image, label, (box[0], box[1] - 5),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+            for (lane_name, image_path), img, (vehicle_counts, detected_vehicles) in zip(batch, images, summaries):
+                if save_output:
+                    self._draw_detections(img, detected_vehicles, image_path)
+                
+                results[lane_name] = {
+                    "count": sum(vehicle_counts.values()),
+                    "vehicle_types": vehicle_counts,
+                    "processing_time": round(processing_time, 3)
+                }
         
-        # Add total count
-        total = len(detections)
-        cv2.putText(image, f"Total vehicles: {total}", (10, 30),
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        return {
+            "vehicle_counts": {lane: data["count"] for lane, data in results.items()},
+            "detailed_results": results
+        }
+            
+    def detect_frames(self, frames, lanes=None):
+        """
+        Detect and count vehicles in already decoded frames with one forward pass
         
+        Args:
+            frames (list): BGR images (numpy arrays)
+            lanes (list): Lane name of each frame, used for ROIs and motion gating
+            
+        Returns:
+            list: Detection results in the detect_vehicles format, one per frame
+        """
+        lanes = lanes or [None] * len(frames)
+        results = []
+        for vehicle_counts, detected_vehicles in self._infer_batch(frames, lanes):
+            results.append({
+                "total_count": sum(vehicle_counts.values()),
+                "vehicle_types": vehicle_counts,
+                "detections": detected_vehicles
+            })
+        return results
+    
+    def _infer_batch(self, images, lanes, gated=None):
+        """
+        Count vehicles in several decoded images, batching them into one forward pass
+        
+        Each image is cropped to its lane's region of interest and checked
+        against the lane's motion gate first; only the remaining crops go
+        through the model.
+        
+        Args:
+            images (list): Decoded images
+            lanes (list): Lane name of each image
+            gated (set): If given, lanes answered by their motion gate are added to it
+            
+        Returns:
+            list: (vehicle_counts, Detections) summary for each image
+        """
+        # Tiled mode already batches the tiles of each image
+        if self.tile_size:
+            return [self._infer(image, lane, gated=gated) for image, lane in zip(images, lanes)]
+        
+        summaries = [None] * len(images)
+        
+        # Crop each image to its lane's region of interest
+        crops = [self._crop_to_roi(image, lane) for image, lane in zip(images, lanes)]
+        
+        # Reuse results for lanes whose motion gate reports no change
+        pending = []
+        for index, (crop, _, _) in enumerate(crops):
+            gate = self._motion_gate(lanes[index])
+            small = None
+            if gate is not None:
+                cached, small = gate.check(crop)
+                if cached is not None:
+                    summaries[index] = self._copy_summary(cached)
+                    if gated is not None:
+                        gated.add(lanes[index])
+                    continue
+            pending.append((index, gate, small))
+        
+        # Single forward pass for the rest of the batch
+        if pending:
+            batch_results = self._predict([crops[index][0] for index, _, _ in pending])
+            for (index, gate, small), result in zip(pending, batch_results):
+                _, offset, polygon = crops[index]
+                summary = self._restore_roi(self._summarize_result(result), offset, polygon)
+                if gate is not None:
+                    gate.update(small, summary)
+                    summary = self._copy_summary(summary)
+                summaries[index] = summary
+        
+        return summaries
+    
+    def _draw_detections(self, image, detections, image_path, output_dir=None):
+        """Draw bounding boxes and labels on the image and save it to the output directory"""
         # Create output filename
-        output_dir = Path("output")
-        output_dir.mkdir(exist_ok=True)
+        output_dir = Path(output_dir or "output")
+        output_dir.mkdir(parents=True, exist_ok=True)
         
         base_name = Path(image_path).stem
         output_path = output_dir / f"{base_name}_detected.jpg"
         
+        if self.output_writer is not None:
+            # Drawing and encoding happen on the writer pool
+            self.output_writer.write_image(output_path, image,
+                                           render=partial(self._render_detections, detections=detections))
+            return
+        
+        image = self._render_detections(image, detections)
+        
         # Save annotated image
-        cv2.imwrite(str(output_path), image)
+        with self._time("write"):
+            cv2.imwrite(str(output_path), image)
         print(f"Annotated image saved to {output_path}")
     
-    def process_video(self, video_path, output_path=None, frame_interval=15):
+    def _render_detections(self, image, detections):
+        """Draw bounding boxes, labels and the vehicle total on an image (in place)"""
+        with self._time("annotate"):
+            # Color mapping for different vehicle types
+            colors = {
+                "car": (0, 255, 0),      # Green
+                "motorcycle": (0, 165, 255),  # Orange
+                "bus": (255, 0, 0),      # Blue
+                "truck": (0, 0, 255)     # Red
+            }
+        
+            # Draw each detection
+            for det in detections:
+                # Get detection info
+                class_name = det["class"]
+                box = det["box"]
+                conf = det["conf"]
+                color = colors.get(class_name, (255, 255, 255))
+            
+                # Draw bounding box
+                cv2.rectangle(image, (box[0], box[1]), (box[2], box[3]), color, 2)
+            
+                # Prepare label text
+                label = f"{class_name} {conf:.2f}"
+            
+                # Draw label background
+                text_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
+                cv2.rectangle(image, (box[0], box[1] - text_size[1] - 10), 
+                             (box[0] + text_size[0], box[1]), color, -1)
+            
+                # Draw text
+                cv2.putText(image, label, (box[0], box[1] - 5),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+        
+            # Add total count
+            total = len(detections)
+            cv2.putText(image, f"Total vehicles: {total}", (10, 30),
+                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        
+        return image
+    
+    def process_video(self, video_path, output_path=None, frame_interval=15, pipelined=False, queue_size=8,
+                      lane=None, track=False, count_line=None, roi=None, workers=1, segments=None,
+                      segment_log=None):
         """
         Process video and count vehicles
         
@@ -191,10 +886,30 @@ class VehicleDetector:
             video_path (str): Path to video file
             output_path (str): Path to save output video (None for no output)
             frame_interval (int): Process every nth frame
+            pipelined (bool): Run decode, inference and annotate/encode as concurrent stages
+            queue_size (int): Maximum frames buffered between pipeline stages
+            lane (str): Lane name used for motion gating (defaults to video_path)
+            track (bool): Track vehicles across sampled frames and report unique counts
+            count_line (tuple): Optional ((x1, y1), (x2, y2)) line; with tracking enabled,
+                vehicles are only counted when they cross it
+            roi: Region of interest (rectangle or {"rect", "polygon"}); defaults to the
+                lane's entry in lane_rois
+            workers (int): Split the video into keyframe-aligned segments processed by this
+                many worker processes, each with its own model (1 processes it in place)
+            segments (int): Number of segments when workers > 1 (default: 4 per worker)
+            segment_log (str): NDJSON file recording each finished segment; rerunning with
+                the same log resumes after the last finished segment
             
         Returns:
-            dict: Average vehicle counts across processed frames
+            dict: Average vehicle counts across processed frames, plus unique vehicle
+                counts and throughput when tracking
         """
+        if workers > 1:
+            if output_path:
+                raise ValueError("Annotated video output isn't supported with more than one worker")
+            return self._process_video_segments(video_path, frame_interval, workers, segments, segment_log,
+                                                lane or video_path, track, count_line, roi)
+        
         # Open video file
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
@@ -208,18 +923,158 @@ class VehicleDetector:
         
         # Setup video writer if output requested
         writer = None
-        if output_path:
+        if output_path and self.output_writer is not None:
+            writer = self.output_writer.open_video(output_path, fps, (width, height))
+        elif output_path:
             fourcc = cv2.VideoWriter_fourcc(*'mp4v')
             writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
         
-        # Variables to track counts
+        # Tracker links detections across sampled frames
+        tracker = None
+        if track:
+            tracker = VehicleTracker(class_names=VEHICLE_TYPES, count_line=count_line)
+        
+        try:
+            if pipelined:
+                all_detections, stage_fps = self._run_video_pipeline(
+                    cap, writer, frame_interval, total_frames, queue_size, lane or video_path, tracker, roi)
+            else:
+                all_detections, stage_fps = self._run_video_sequential(
+                    cap, writer, frame_interval, total_frames, lane or video_path, tracker, roi), None
+        finally:
+            # Release resources
+            cap.release()
+            if writer:
+                writer.release()
+        
+        summary = self._summarize_video(all_detections, total_frames)
+        if tracker is not None and "error" not in summary:
+            unique_by_type = tracker.finish()
+            unique_count = sum(unique_by_type.values())
+            duration = total_frames / fps if fps > 0 else 0.0
+            summary["unique_count"] = unique_count
+            summary["unique_by_type"] = unique_by_type
+            summary["vehicles_per_minute"] = round(unique_count * 60 / duration, 1) if duration else 0.0
+        if stage_fps is not None and "error" not in summary:
+            summary["stage_fps"] = stage_fps
+        return summary
+    
+    def _process_video_segments(self, video_path, frame_interval, workers, segments, segment_log, lane,
+                                track, count_line, roi):
+        """
+        Process keyframe-aligned segments of a video in parallel worker processes
+        
+        Every worker seeks to its segment with CAP_PROP_POS_FRAMES and runs its
+        own detector. Finished segments are printed as progress and appended
+        to segment_log, and segments already in the log are not processed again.
+        The log is removed once every segment has finished, so it only ever
+        resumes an interrupted run.
+        
+        Returns:
+            dict: The process_video summary, merged over all segments
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file {video_path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        
+        plan = plan_segments(total_frames, segments or workers * 4, find_keyframes(video_path))
+        
+        # Resume from the log if it was written for this exact job
+        log = None
+        completed = {}
+        if segment_log:
+            stat = os.stat(video_path)
+            header = {
+                "video": os.path.abspath(video_path),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "frame_interval": frame_interval,
+                "lane": lane,
+                "roi": roi,
+                "track": track,
+                "count_line": count_line,
+                "segments": plan,
+                # A different model or detector setting must not reuse old counts
+                "detector": self._worker_config()
+            }
+            # Round-trip so tuples compare equal to the lists read back from the log
+            header = json.loads(json.dumps(header))
+            log = SegmentLog(segment_log)
+            completed = log.open(header)
+            if completed:
+                print(f"Resuming: {len(completed)}/{len(plan)} segments already done")
+        
+        pending = [segment for segment in plan if segment[0] not in completed]
+        results = dict(completed)
+        
+        try:
+            if pending:
+                context = get_context("spawn")
+                with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=context,
+                                         initializer=init_worker, initargs=(self._worker_config(),)) as pool:
+                    futures = [pool.submit(process_segment, video_path, segment, frame_interval, lane, roi,
+                                           track, count_line)
+                               for segment in pending]
+                    for future in as_completed(futures):
+                        result = future.result()
+                        results[result["segment"]] = result
+                        if log is not None:
+                            log.append(result)
+                        print(f"Segment {len(results)}/{len(plan)} done: frames {result['start']}-{result['end']} "
+                              f"in {result['elapsed']:.1f}s")
+        finally:
+            if log is not None:
+                log.close()
+        
+        # The run is complete: nothing is left to resume
+        if log is not None:
+            os.remove(segment_log)
+        
+        ordered = [results[index] for index in sorted(results)]
+        all_detections = [counts for result in ordered for counts in result["frame_counts"]]
+        summary = self._summarize_video(all_detections, total_frames)
+        if "error" in summary:
+            return summary
+        
+        summary["segments"] = {"total": len(plan), "resumed": len(completed)}
+        if track:
+            unique_by_type, duplicates = stitch_tracks(ordered)
+            unique_count = sum(unique_by_type.values())
+            duration = total_frames / fps if fps > 0 else 0.0
+            summary["unique_count"] = unique_count
+            summary["unique_by_type"] = unique_by_type
+            summary["vehicles_per_minute"] = round(unique_count * 60 / duration, 1) if duration else 0.0
+            summary["segments"]["stitched_tracks"] = duplicates
+        return summary
+    
+    def _worker_config(self):
+        """Constructor arguments that rebuild this detector in a worker process"""
+        return {
+            "model_size": self.model_size,
+            "confidence": self.confidence,
+            "motion_threshold": self.motion_threshold,
+            "lane_motion_thresholds": self.lane_motion_thresholds,
+            "backend": self.backend,
+            "imgsz": self.imgsz,
+            "precision": self.precision,
+            "tile_size": self.tile_size,
+            "tile_overlap": self.tile_overlap,
+            "lane_rois": self.lane_rois
+        }
+    
+    def _run_video_sequential(self, cap, writer, frame_interval, total_frames, lane=None, tracker=None,
+                              roi=None):
+        """Read, detect and write frames one after another on the calling thread"""
         frame_count = 0
-        processed_frames = 0
         all_detections = []
         
         # Process frames
         while cap.isOpened():
-            ret, frame = cap.read()
+            with self._time("decode"):
+                ret, frame = cap.read()
             if not ret:
                 break
                 
@@ -229,85 +1084,222 @@ class VehicleDetector:
             if frame_count % frame_interval != 0:
                 # Write original frame if we're saving video
                 if writer:
-                    writer.write(frame)
+                    self._write_frame(writer, frame)
                 continue
             
             # Process frame
-            results = self.model(frame, conf=self.confidence)
-            processed_frames += 1
-            
-            # Extract vehicle detections
-            boxes = results[0].boxes
-            frame_vehicles = {
-                "car": 0,
-                "motorcycle": 0,
-                "bus": 0, 
-                "truck": 0
-            }
-            
-            detections = []
-            
-            for i in range(len(boxes)):
-                cls_id = int(boxes.cls[i].item())
-                
-                # Check if detection is a vehicle
-                if cls_id in self.vehicle_classes:
-                    # Get class name and box
-                    class_name = self.class_names[cls_id]
-                    frame_vehicles[class_name] += 1
-                    
-                    # For visualization
-                    if writer:
-                        x1, y1, x2, y2 = boxes.xyxy[i].cpu().numpy()
-                        conf = boxes.conf[i].item()
-                        detections.append({
-                            "class": class_name,
-                            "box": (int(x1), int(y1), int(x2), int(y2)),
-                            "conf": conf
-                        })
+            frame_vehicles, detections = self._infer(frame, lane, roi=roi)
+            if tracker is not None:
+                tracker.update(detections)
             
             # Store frame results
             all_detections.append(frame_vehicles)
             
             # Draw detections if saving video
             if writer:
-                annotated_frame = frame.copy()
-                # Color mapping
-                colors = {
-                    "car": (0, 255, 0),
-                    "motorcycle": (0, 165, 255),
-                    "bus": (255, 0, 0),
-                    "truck": (0, 0, 255)
-                }
-                
-                # Draw each detection
-                for det in detections:
-                    box = det["box"]
-                    class_name = det["class"]
-                    conf = det["conf"]
-                    color = colors.get(class_name, (255, 255, 255))
-                    
-                    cv2.rectangle(annotated_frame, (box[0], box[1]), (box[2], box[3]), color, 2)
-                    label = f"{class_name} {conf:.2f}"
-                    cv2.putText(annotated_frame, label, (box[0], box[1] - 5),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-                
-                # Add frame count
-                total = sum(frame_vehicles.values())
-                cv2.putText(annotated_frame, f"Vehicles: {total}", (10, 30),
-                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                           
-                # Show processing progress
-                progress = f"Processing: {frame_count}/{total_frames}"
-                cv2.putText(annotated_frame, progress, (10, height - 20),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-                
-                writer.write(annotated_frame)
+                self._write_frame(writer, frame, partial(self._annotate_frame, detections=detections,
+                                                         frame_vehicles=frame_vehicles,
+                                                         frame_count=frame_count, total_frames=total_frames))
         
-        # Release resources
-        cap.release()
+        return all_detections
+    
+    def _run_video_pipeline(self, cap, writer, frame_interval, total_frames, queue_size, lane=None,
+                            tracker=None, roi=None):
+        """
+        Run decode, inference and annotate/encode as concurrent stages
+        
+        Frames move between stages through bounded queues, so a slow stage
+        applies backpressure instead of buffering the whole video in memory.
+        Frames skipped by frame_interval are only grabbed (not decoded) unless
+        they are needed for the output video.
+        
+        Args:
+            cap (cv2.VideoCapture): Opened video capture
+            writer (cv2.VideoWriter): Output writer (None for no output)
+            frame_interval (int): Process every nth frame
+            total_frames (int): Frame count reported by the container
+            queue_size (int): Maximum frames buffered between stages
+            lane (str): Lane key for motion gating
+            tracker (VehicleTracker): Tracker fed with every sampled frame's detections
+            roi: Region of interest applied to every sampled frame
+            
+        Returns:
+            tuple: (per-frame vehicle counts, frames per second for each stage)
+        """
+        decode_queue = queue.Queue(maxsize=queue_size)
+        write_queue = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+        errors = []
+        
+        # Frames handled and busy seconds for each stage
+        stage_stats = {
+            "decode": [0, 0.0],
+            "infer": [0, 0.0],
+            "write": [0, 0.0]
+        }
+        
+        def put(q, item):
+            # Block while the queue is full, but give up once the pipeline is stopping
+            while True:
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    if stop.is_set():
+                        return
+        
+        def get(q):
+            # Wait for the next item, returning None once the pipeline is stopping
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            return None
+        
+        def decode_stage():
+            frame_count = 0
+            try:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    sampled = (frame_count + 1) % frame_interval == 0
+                    with self._time("decode"):
+                        if sampled or writer:
+                            ret, frame = cap.read()
+                        else:
+                            # Skipped frame is not needed, so advance without decoding it
+                            ret, frame = cap.grab(), None
+                    if not ret:
+                        break
+                    frame_count += 1
+                    stage_stats["decode"][0] += 1
+                    stage_stats["decode"][1] += time.perf_counter() - start
+                    put(decode_queue, (frame_count, frame, sampled))
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                put(decode_queue, None)
+        
+        def write_stage():
+            try:
+                while True:
+                    item = get(write_queue)
+                    if item is None:
+                        break
+                    start = time.perf_counter()
+                    frame_count, frame, summary = item
+                    render = None
+                    if summary is not None:
+                        frame_vehicles, detections = summary
+                        render = partial(self._annotate_frame, detections=detections,
+                                         frame_vehicles=frame_vehicles,
+                                         frame_count=frame_count, total_frames=total_frames)
+                    self._write_frame(writer, frame, render)
+                    stage_stats["write"][0] += 1
+                    stage_stats["write"][1] += time.perf_counter() - start
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+        
+        threads = [threading.Thread(target=decode_stage, daemon=True)]
         if writer:
-            writer.release()
+            threads.append(threading.Thread(target=write_stage, daemon=True))
+        for thread in threads:
+            thread.start()
+        
+        all_detections = []
+        try:
+            # Inference stage runs on the calling thread
+            while True:
+                item = get(decode_queue)
+                if item is None:
+                    break
+                frame_count, frame, sampled = item
+                summary = None
+                if sampled:
+                    start = time.perf_counter()
+                    summary = self._infer(frame, lane, roi=roi)
+                    all_detections.append(summary[0])
+                    if tracker is not None:
+                        tracker.update(summary[1])
+                    stage_stats["infer"][0] += 1
+                    stage_stats["infer"][1] += time.perf_counter() - start
+                if writer:
+                    put(write_queue, (frame_count, frame, summary))
+        except Exception:
+            stop.set()
+            raise
+        finally:
+            if writer:
+                put(write_queue, None)
+            for thread in threads:
+                thread.join()
+        
+        if errors:
+            raise errors[0]
+        
+        if not writer:
+            del stage_stats["write"]
+        
+        stage_fps = {
+            stage: round(frames / busy, 1) if busy > 0 else 0.0
+            for stage, (frames, busy) in stage_stats.items()
+        }
+        return all_detections, stage_fps
+    
+    def _write_frame(self, writer, frame, render=None):
+        """Write a video frame, annotating it with render first if given"""
+        if self.output_writer is not None:
+            # Annotation and encoding run on the video's writer thread
+            writer.write(frame, render)
+            return
+        
+        if render is not None:
+            frame = render(frame)
+        with self._time("write"):
+            writer.write(frame)
+    
+    def _annotate_frame(self, frame, detections, frame_vehicles, frame_count, total_frames):
+        """Draw detections, vehicle total and progress on a copy of a video frame"""
+        with self._time("annotate"):
+            annotated_frame = frame.copy()
+            height = annotated_frame.shape[0]
+            # Color mapping
+            colors = {
+                "car": (0, 255, 0),
+                "motorcycle": (0, 165, 255),
+                "bus": (255, 0, 0),
+                "truck": (0, 0, 255)
+            }
+        
+            # Draw each detection
+            for det in detections:
+                box = det["box"]
+                class_name = det["class"]
+                conf = det["conf"]
+                color = colors.get(class_name, (255, 255, 255))
+            
+                cv2.rectangle(annotated_frame, (box[0], box[1]), (box[2], box[3]), color, 2)
+                label = f"{class_name} {conf:.2f}"
+                cv2.putText(annotated_frame, label, (box[0], box[1] - 5),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+        
+            # Add frame count
+            total = sum(frame_vehicles.values())
+            cv2.putText(annotated_frame, f"Vehicles: {total}", (10, 30),
+                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                   
+            # Show processing progress
+            progress = f"Processing: {frame_count}/{total_frames}"
+            cv2.putText(annotated_frame, progress, (10, height - 20),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        
+        return annotated_frame
+    
+    def _summarize_video(self, all_detections, total_frames):
+        """Average per-frame vehicle counts into the process_video summary"""
+        processed_frames = len(all_detections)
         
         # Calculate average counts across all processed frames
         if processed_frames > 0:
@@ -327,11 +1319,28 @@ class VehicleDetector:
             return {"error": "No frames were processed"}
 
 
-def export_json(data, output_file):
-    """Export results to JSON file"""
+def export_json(data, output_file, publisher=None, intersection=None, direction=None):
+    """
+    Export results to JSON file
+    
+    Args:
+        data (dict): Results with a "vehicle_counts" entry
+        output_file (str): Path of the JSON file
+        publisher (CountsPublisher): Also push the counts to the backend (None to skip)
+        intersection (str): Intersection ID the counts belong to
+        direction (str): Publish the single lane's count as this direction (for
+            'image' and 'video' results, whose lane isn't named after a direction)
+    """
     with open(output_file, 'w') as f:
         json.dump(data, f, indent=2)
     print(f"Results exported to {output_file}")
+    
+    if publisher is not None:
+        vehicle_counts = data["vehicle_counts"]
+        if direction is not None:
+            vehicle_counts = {direction: sum(vehicle_counts.values())}
+        for result in publisher.publish([counts_to_record(vehicle_counts, intersection)]):
+            print(f"Backend: {result['status']} - {result['message']}")
 
 
 # Main function to run the tool directly
@@ -340,24 +1349,117 @@ def main():
     
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="YOLO Vehicle Detection System")
-    parser.add_argument("--mode", choices=["image", "images", "video"], default="images", 
-                       help="Detection mode: single image, multiple images, or video")
-    parser.add_argument("--input", required=True, help="Input image, directory, or video path")
+    parser.add_argument("--mode", choices=["image", "images", "video", "stream"], default="images", 
+                       help="Detection mode: single image, multiple images, video, or live lane streams")
+    parser.add_argument("--input", required=True,
+                       help="Input image, directory, or video path; for 'stream' mode, lane=source pairs "
+                            "separated by commas (RTSP URL, camera index or video file) or a JSON file of them")
     parser.add_argument("--output", default="vehicle_counts.json", help="Output JSON file")
     parser.add_argument("--save-visuals", action="store_true", help="Save annotated images/video")
     parser.add_argument("--model", default="n", choices=["n", "s", "m", "l", "x"], 
                        help="YOLOv8 model size (n=nano, s=small, m=medium, l=large, x=xlarge)")
     parser.add_argument("--conf", type=float, default=0.25, help="Confidence threshold")
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "openvino"],
+                       help="Inference backend (exported models are cached in models/)")
+    parser.add_argument("--imgsz", type=int, default=640, help="Model input resolution")
+    parser.add_argument("--precision", default="fp32", choices=["fp32", "fp16", "int8"],
+                       help="Backend precision (int8 is calibrated on images/)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                       help="Lane images per forward pass in 'images' mode (default: one pass per lane)")
+    parser.add_argument("--tile-size", type=int, default=None,
+                       help="Run tiled inference with tiles of this many pixels (for small, distant vehicles)")
+    parser.add_argument("--tile-overlap", type=float, default=0.2, help="Overlap between neighbouring tiles")
+    parser.add_argument("--rois", default=None,
+                       help="JSON file mapping lane names to regions of interest "
+                            "(a rectangle or {\"rect\": [...], \"polygon\": [[x, y], ...]})")
+    parser.add_argument("--cache-dir", default=None,
+                       help="Cache detection results by image content in this directory")
+    parser.add_argument("--writer-threads", type=int, default=2,
+                       help="Background threads rendering and encoding --save-visuals output (0 writes inline)")
+    parser.add_argument("--writer-queue", type=int, default=32,
+                       help="Maximum annotated images/frames waiting to be written")
+    parser.add_argument("--writer-policy", default="block", choices=POLICIES,
+                       help="What to do when the writer queue is full")
+    parser.add_argument("--jpeg-quality", type=int, default=95, help="JPEG quality of annotated images")
+    parser.add_argument("--save-every", type=int, default=1, help="Only save every nth annotated image")
+    parser.add_argument("--metrics", action="store_true",
+                       help="Time every pipeline stage and print p50/p95/p99 latencies")
+    parser.add_argument("--motion-threshold", type=float, default=None,
+                       help="Reuse the last detections when less than this fraction of pixels changed")
+    parser.add_argument("--frame-interval", type=int, default=15,
+                       help="Process every nth frame in 'video' mode")
+    parser.add_argument("--track", action="store_true",
+                       help="Track vehicles in 'video' mode and report unique counts")
+    parser.add_argument("--count-line", type=float, nargs=4, metavar=("X1", "Y1", "X2", "Y2"),
+                       help="With --track, only count vehicles that cross this line")
+    parser.add_argument("--server", default=os.environ.get("DETECTOR_SERVICE"),
+                       help="host:port of a running detector_service to send jobs to "
+                            "instead of loading the model (default: $DETECTOR_SERVICE)")
+    parser.add_argument("--publish", nargs="?", const=DEFAULT_BACKEND_URL, default=None, metavar="URL",
+                       help=f"Push the counts to the traffic backend (default URL: {DEFAULT_BACKEND_URL})")
+    parser.add_argument("--intersection", default=None,
+                       help="Intersection ID the counts are published for")
+    parser.add_argument("--direction", choices=DIRECTIONS, default=None,
+                       help="Signal direction the 'image' or 'video' count is published for "
+                            "(required with --publish in those modes)")
+    parser.add_argument("--pipelined", action="store_true",
+                       help="Overlap decode, inference and encoding in 'video' mode")
+    parser.add_argument("--stream-interval", type=float, default=1.0,
+                       help="Seconds between inferences on each lane in 'stream' mode")
+    parser.add_argument("--stream-window", type=int, default=5,
+                       help="Recent counts averaged into each lane's published count in 'stream' mode")
+    parser.add_argument("--duration", type=float, default=None,
+                       help="Seconds to run 'stream' mode (default: until interrupted)")
+    parser.add_argument("--workers", type=int, default=1,
+                       help="Worker processes for 'video' mode; the video is split into segments "
+                            "processed in parallel")
+    parser.add_argument("--segments", type=int, default=None,
+                       help="Number of video segments with --workers (default: 4 per worker)")
+    parser.add_argument("--segment-log", default=None,
+                       help="NDJSON progress log for --workers; an interrupted run resumes from it, "
+                            "and it is removed once the run finishes (default: <output>.segments.ndjson)")
     
     args = parser.parse_args()
     
-    # Initialize detector
-    detector = VehicleDetector(model_size=args.model, confidence=args.conf)
+    # A single image or video is one lane that isn't named after a direction
+    if args.publish and args.mode in ("image", "video") and args.direction is None:
+        parser.error(f"--publish in '{args.mode}' mode needs --direction")
+    
+    # Load per-lane regions of interest
+    lane_rois = None
+    if args.rois:
+        with open(args.rois) as f:
+            lane_rois = json.load(f)
+    
+    # Batched keep-alive client for the traffic backend
+    publisher = CountsPublisher(args.publish) if args.publish else None
+    
+    # Annotated output is written by a background pool so it doesn't slow down counting
+    output_writer = None
+    if args.save_visuals and args.writer_threads > 0 and not args.server:
+        output_writer = OutputWriter(workers=args.writer_threads, queue_size=args.writer_queue,
+                                     policy=args.writer_policy, jpeg_quality=args.jpeg_quality,
+                                     sample_every=args.save_every,
+                                     metrics=default_metrics if args.metrics else None)
+    
+    # Initialize detector (or a client for an already warmed detector service)
+    if args.server:
+        from detector_service import DetectorClient, parse_address
+        detector = DetectorClient(*parse_address(args.server))
+    else:
+        detector = VehicleDetector(model_size=args.model, confidence=args.conf,
+                                   motion_threshold=args.motion_threshold,
+                                   backend=args.backend, imgsz=args.imgsz, precision=args.precision,
+                                   tile_size=args.tile_size, tile_overlap=args.tile_overlap,
+                                   lane_rois=lane_rois,
+                                   result_cache=ResultCache(disk_dir=args.cache_dir) if args.cache_dir else None,
+                                   metrics=default_metrics if args.metrics else None,
+                                   output_writer=output_writer)
     
     try:
         if args.mode == "image":
             # Process a single image
-            results = detector.detect_vehicles(args.input, save_output=args.save_visuals)
+            results = detector.detect_vehicles(args.input, save_output=args.save_visuals, lane="Image")
             output = {
                 "vehicle_counts": {"Image": results["total_count"]},
                 "detailed_results": {"Image": {
@@ -365,7 +1467,7 @@ def main():
                     "vehicle_types": results["vehicle_types"]
                 }}
             }
-            export_json(output, args.output)
+            export_json(output, args.output, publisher, args.intersection, args.direction)
             
         elif args.mode == "images":
             # Process multiple images (lane-based)
@@ -386,8 +1488,9 @@ def main():
                     lane_images[lane_name] = os.path.join(args.input, img)
                 
                 # Process lanes
-                results = detector.process_lanes(lane_images, save_output=args.save_visuals)
-                export_json(results, args.output)
+                results = detector.process_lanes(lane_images, save_output=args.save_visuals,
+                                                 batch_size=args.batch_size)
+                export_json(results, args.output, publisher, args.intersection)
                 
             else:
                 print("Expected a directory for 'images' mode")
@@ -400,7 +1503,20 @@ def main():
                 output_dir.mkdir(exist_ok=True)
                 output_video = str(output_dir / f"{Path(args.input).stem}_detected.mp4")
                 
-            results = detector.process_video(args.input, output_path=output_video)
+            count_line = None
+            if args.count_line:
+                count_line = (tuple(args.count_line[:2]), tuple(args.count_line[2:]))
+                
+            segment_log = None
+            if args.workers > 1:
+                segment_log = args.segment_log or str(Path(args.output).with_suffix(".segments.ndjson"))
+                
+            results = detector.process_video(args.input, output_path=output_video,
+                                             frame_interval=args.frame_interval,
+                                             pipelined=args.pipelined,
+                                             track=args.track, count_line=count_line,
+                                             lane="Video", workers=args.workers,
+                                             segments=args.segments, segment_log=segment_log)
             
             # Format output for backend
             output = {
@@ -413,10 +1529,65 @@ def main():
                     }
                 }
             }
+            if "unique_count" in results:
+                output["detailed_results"]["Video"]["unique_count"] = results["unique_count"]
+                output["detailed_results"]["Video"]["unique_by_type"] = results["unique_by_type"]
+                output["detailed_results"]["Video"]["vehicles_per_minute"] = results["vehicles_per_minute"]
+            if "stage_fps" in results:
+                output["detailed_results"]["Video"]["stage_fps"] = results["stage_fps"]
+            if "segments" in results:
+                output["detailed_results"]["Video"]["segments"] = results["segments"]
+            if args.motion_threshold is not None and not args.server:
+                output["detailed_results"]["Video"]["motion_gating"] = detector.motion_stats()
+            export_json(output, args.output, publisher, args.intersection, args.direction)
+            
+        elif args.mode == "stream":
+            if args.server:
+                raise ValueError("'stream' mode needs a local detector, not --server")
+            
+            # Rolling counts are published as they are produced, not at the end
+            counter = StreamCounter(detector, parse_sources(args.input), interval=args.stream_interval,
+                                    window=args.stream_window, publisher=publisher,
+                                    intersection=args.intersection)
+            try:
+                counter.run(duration=args.duration)
+            except KeyboardInterrupt:
+                print("Stopping streams")
+            finally:
+                counter.close()
+            
+            stats = counter.stats()
+            for lane, lane_stats in stats.items():
+                latency = lane_stats["latency_ms"] or {"p50": "-", "p95": "-"}
+                print(f"{lane}: {lane_stats['frames_processed']} counted, {lane_stats['frames_dropped']} dropped, "
+                      f"latency p50 {latency['p50']} ms / p95 {latency['p95']} ms")
+            output = {
+                "vehicle_counts": counter.rolling_counts(),
+                "detailed_results": stats
+            }
             export_json(output, args.output)
             
     except Exception as e:
         print(f"Error: {e}")
+    finally:
+        if publisher is not None:
+            publisher.close()
+        if output_writer is not None:
+            # Wait for the queued annotated output to be written
+            output_writer.close()
+            stats = output_writer.stats()
+            dropped = stats["images_dropped"] + stats["video_frames_dropped"]
+            print(f"Annotated output: {stats['images_written']} images and "
+                  f"{stats['video_frames_written']} video frames written, {dropped} dropped")
+            for error in stats["errors"]:
+                print(f"Write error: {error}")
+        
+    if args.metrics and not args.server:
+        print("\nStage timings:")
+        print(f"{'Stage':<12}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage, stats in default_metrics.summary().items():
+            print(f"{stage:<12}{stats['count']:>8}{stats['mean_ms']:>10}{stats['p50_ms']:>10}"
+                  f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,358 @@
+# Lightweight multi-object tracker for counting unique vehicles in video
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Compute pairwise IoU between two sets of boxes
+
+    Args:
+        boxes_a (numpy.ndarray): (N, 4) boxes as x1, y1, x2, y2
+        boxes_b (numpy.ndarray): (M, 4) boxes as x1, y1, x2, y2
+
+    Returns:
+        numpy.ndarray: (N, M) IoU values
+    """
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - inter
+
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def _boxes_to_measurements(boxes):
+    """Convert x1, y1, x2, y2 boxes to centre x, centre y, area, aspect ratio"""
+    w = boxes[:, 2] - boxes[:, 0]
+    h = np.maximum(boxes[:, 3] - boxes[:, 1], 1e-6)
+    return np.stack([boxes[:, 0] + w / 2, boxes[:, 1] + h / 2, w * h, w / h], axis=1)
+
+
+def _states_to_boxes(states):
+    """Convert Kalman states back to x1, y1, x2, y2 boxes"""
+    area = np.maximum(states[:, 2], 1e-6)
+    w = np.sqrt(area * np.maximum(states[:, 3], 1e-6))
+    h = area / w
+    return np.stack([states[:, 0] - w / 2, states[:, 1] - h / 2,
+                     states[:, 0] + w / 2, states[:, 1] + h / 2], axis=1)
+
+
+class VehicleTracker:
+    """
+    SORT-style tracker that links vehicle detections across sampled frames
+
+    Every track carries a constant-velocity Kalman filter over centre, area
+    and aspect ratio. All tracks are predicted and updated together as NumPy
+    arrays, and detections are associated with tracks by greedy IoU matching
+    against the predicted boxes, so the tracker keeps up even when frames are
+    sampled far apart.
+    """
+
+    # State transition: position, area and their velocities (aspect ratio is constant)
+    _F = np.eye(7)
+    _F[0, 4] = _F[1, 5] = _F[2, 6] = 1.0
+
+    _P0 = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4])
+    _Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 1e-4])
+    _R = np.diag([1.0, 1.0, 10.0, 10.0])
+
+    def __init__(self, class_names=("car", "motorcycle", "bus", "truck"), iou_threshold=0.2,
+                 max_age=3, min_hits=2, count_line=None, max_distance=3.0):
+        """
+        Initialize the tracker
+
+        Args:
+            class_names (tuple): Vehicle type names that detections can have
+            iou_threshold (float): Minimum IoU between a prediction and a detection to match
+            max_age (int): Sampled frames a track survives without a matching detection
+            min_hits (int): Matches needed before a track counts as a real vehicle
+            count_line (tuple): Optional ((x1, y1), (x2, y2)) line; when set, vehicles are
+                only counted when their centre crosses it
+            max_distance (float): Largest distance, in vehicle sizes (square root of the box
+                area), between a predicted and a detected centre for tracks and detections
+                left unmatched by IoU
+        """
+        self.class_names = list(class_names)
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.max_distance = max_distance
+        self.count_line = None
+        if count_line is not None:
+            self.count_line = np.asarray(count_line, dtype=np.float64).reshape(2, 2)
+
+        # Track arrays, one row per live track
+        self.states = np.zeros((0, 7))
+        self.covariances = np.zeros((0, 7, 7))
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int64)
+        self.class_votes = np.zeros((0, len(self.class_names)), dtype=np.int64)
+        self.counted = np.zeros(0, dtype=bool)
+        self.centres = np.zeros((0, 2))
+
+        self.next_id = 1
+        self.unique_counts = {name: 0 for name in self.class_names}
+        # Vehicle type each counted track was counted as, by track id
+        self.counted_types = {}
+
+    def update(self, detections):
+        """
+        Advance all tracks by one sampled frame and associate new detections
+
+        Args:
+            detections: Detections record view (whose type indices follow class_names),
+                or a list of dicts with "class" and "box" (x1, y1, x2, y2)
+
+        Returns:
+            list: Track id for each detection, in the same order
+        """
+        if hasattr(detections, "array"):
+            boxes = detections.boxes.astype(np.float64)
+            classes = detections.types.astype(np.int64)
+        elif detections:
+            boxes = np.array([det["box"] for det in detections], dtype=np.float64)
+            classes = np.array([self.class_names.index(det["class"]) for det in detections])
+        else:
+            boxes = np.zeros((0, 4))
+            classes = np.zeros(0, dtype=np.int64)
+
+        self._predict()
+        matches, unmatched = self._associate(boxes)
+
+        track_ids = np.zeros(len(boxes), dtype=np.int64)
+
+        # Correct matched tracks with their detections
+        if len(matches):
+            track_rows, det_rows = matches[:, 0], matches[:, 1]
+            self._correct(track_rows, _boxes_to_measurements(boxes[det_rows]))
+            self.hits[track_rows] += 1
+            self.misses[track_rows] = 0
+            np.add.at(self.class_votes, (track_rows, classes[det_rows]), 1)
+            track_ids[det_rows] = self.ids[track_rows]
+
+        # Start new tracks for unmatched detections
+        if len(unmatched):
+            track_ids[unmatched] = self._spawn(boxes[unmatched], classes[unmatched])
+
+        self._count_vehicles()
+        self._prune()
+
+        return track_ids.tolist()
+
+    def finish(self):
+        """
+        Count confirmed tracks that are still alive at the end of the video
+
+        Returns:
+            dict: Unique vehicle counts by type
+        """
+        if self.count_line is None:
+            for row in np.flatnonzero(~self.counted & (self.hits >= self.min_hits)):
+                self._count_track(row)
+
+        self._drop(np.arange(len(self.ids)))
+        return dict(self.unique_counts)
+
+    def boundary_tracks(self):
+        """
+        Tracks seen in the latest frame, with their boxes predicted one frame ahead
+
+        Used to stitch tracks across independently tracked video segments.
+
+        Returns:
+            list: {"id", "box"} dicts (box as x1, y1, x2, y2)
+        """
+        rows = np.flatnonzero(self.misses == 0)
+        boxes = _states_to_boxes(self.states[rows] @ self._F.T)
+        return [{"id": int(self.ids[row]), "box": box} for row, box in zip(rows, boxes.tolist())]
+
+    def _predict(self):
+        """Propagate every track's Kalman state one step forward"""
+        if not len(self.states):
+            return
+
+        # Keep the predicted area positive
+        shrinking = self.states[:, 2] + self.states[:, 6] <= 0
+        self.states[shrinking, 6] = 0.0
+
+        self.states = self.states @ self._F.T
+        self.covariances = self._F @ self.covariances @ self._F.T + self._Q
+        self.misses += 1
+
+    def _associate(self, boxes):
+        """
+        Greedily match detections to predicted tracks by IoU, then by centre distance
+
+        The distance pass catches vehicles that moved further than their own
+        size between samples (a new track has no velocity yet, so its
+        prediction doesn't overlap the next detection).
+
+        Returns:
+            tuple: ((K, 2) array of track/detection row pairs, unmatched detection rows)
+        """
+        if not len(self.states) or not len(boxes):
+            return np.zeros((0, 2), dtype=np.int64), np.arange(len(boxes))
+
+        ious = iou_matrix(_states_to_boxes(self.states), boxes)
+
+        # Visit candidate pairs from best to worst overlap
+        track_rows, det_rows = np.nonzero(ious >= self.iou_threshold)
+        order = np.argsort(-ious[track_rows, det_rows], kind="stable")
+
+        used_tracks = np.zeros(len(self.states), dtype=bool)
+        used_dets = np.zeros(len(boxes), dtype=bool)
+        matches = []
+        for track_row, det_row in zip(track_rows[order], det_rows[order]):
+            if used_tracks[track_row] or used_dets[det_row]:
+                continue
+            used_tracks[track_row] = used_dets[det_row] = True
+            matches.append((track_row, det_row))
+
+        free_tracks = np.flatnonzero(~used_tracks)
+        free_dets = np.flatnonzero(~used_dets)
+        if len(free_tracks) and len(free_dets):
+            # Centre distance in multiples of the track's size, so the gate is the
+            # same for near and distant vehicles
+            centres = _boxes_to_measurements(boxes[free_dets])[:, :2]
+            offsets = self.states[free_tracks, None, :2] - centres[None]
+            sizes = np.sqrt(np.maximum(self.states[free_tracks, 2], 1e-6))
+            distances = np.linalg.norm(offsets, axis=2) / sizes[:, None]
+
+            # Visit candidate pairs from nearest to furthest
+            track_rows, det_rows = np.nonzero(distances <= self.max_distance)
+            order = np.argsort(distances[track_rows, det_rows], kind="stable")
+            for track_row, det_row in zip(free_tracks[track_rows[order]], free_dets[det_rows[order]]):
+                if used_tracks[track_row] or used_dets[det_row]:
+                    continue
+                used_tracks[track_row] = used_dets[det_row] = True
+                matches.append((track_row, det_row))
+
+        return np.array(matches, dtype=np.int64).reshape(-1, 2), np.flatnonzero(~used_dets)
+
+    def _correct(self, rows, measurements):
+        """Apply the Kalman measurement update to the given track rows"""
+        states = self.states[rows]
+        covariances = self.covariances[rows]
+
+        # H selects the first four state components
+        residuals = measurements - states[:, :4]
+        innovation = covariances[:, :4, :4] + self._R
+        gains = covariances[:, :, :4] @ np.linalg.inv(innovation)
+
+        self.states[rows] = states + np.einsum("nij,nj->ni", gains, residuals)
+        self.covariances[rows] = covariances - gains @ covariances[:, :4, :]
+
+    def _spawn(self, boxes, classes):
+        """Start a new track for each box and return the new track ids"""
+        count = len(boxes)
+        ids = np.arange(self.next_id, self.next_id + count)
+        self.next_id += count
+
+        states = np.zeros((count, 7))
+        states[:, :4] = _boxes_to_measurements(boxes)
+        votes = np.zeros((count, len(self.class_names)), dtype=np.int64)
+        votes[np.arange(count), classes] = 1
+
+        self.states = np.concatenate([self.states, states])
+        self.covariances = np.concatenate([self.covariances, np.repeat(self._P0[None], count, axis=0)])
+        self.ids = np.concatenate([self.ids, ids])
+        self.hits = np.concatenate([self.hits, np.ones(count, dtype=np.int64)])
+        self.misses = np.concatenate([self.misses, np.zeros(count, dtype=np.int64)])
+        self.class_votes = np.concatenate([self.class_votes, votes])
+        self.counted = np.concatenate([self.counted, np.zeros(count, dtype=bool)])
+        self.centres = np.concatenate([self.centres, states[:, :2]])
+
+        return ids
+
+    def _count_vehicles(self):
+        """Count tracks that crossed the counting line since the last frame"""
+        if self.count_line is None:
+            return
+
+        centres = self.states[:, :2].copy()
+        (x1, y1), (x2, y2) = self.count_line
+        direction = np.array([x2 - x1, y2 - y1])
+        length_sq = max(direction @ direction, 1e-9)
+
+        def side(points):
+            return np.sign(direction[0] * (points[:, 1] - y1) - direction[1] * (points[:, 0] - x1))
+
+        # Crossing point must lie within the segment, not just on the infinite line
+        previous = self.centres
+        seen = self.misses == 0
+        crossed = (side(previous) * side(centres) < 0) & seen & (self.hits >= self.min_hits) & ~self.counted
+        midpoints = (previous + centres) / 2
+        along = ((midpoints - self.count_line[0]) @ direction) / length_sq
+        crossed &= (along >= 0) & (along <= 1)
+
+        for row in np.flatnonzero(crossed):
+            self._count_track(row)
+
+        # Only move the reference centre of tracks that were seen this frame
+        self.centres[seen] = centres[seen]
+
+    def _count_track(self, row):
+        """Count one track under its majority vehicle type"""
+        self.counted[row] = True
+        name = self.class_names[int(np.argmax(self.class_votes[row]))]
+        self.unique_counts[name] += 1
+        self.counted_types[int(self.ids[row])] = name
+
+    def _prune(self):
+        """Remove tracks that have gone unmatched for longer than max_age"""
+        expired = np.flatnonzero(self.misses > self.max_age)
+        if not len(expired):
+            return
+
+        if self.count_line is None:
+            for row in expired:
+                if not self.counted[row] and self.hits[row] >= self.min_hits:
+                    self._count_track(row)
+
+        self._drop(expired)
+
+    def _drop(self, rows):
+        """Delete the given track rows from every track array"""
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[rows] = False
+        self.states = self.states[keep]
+        self.covariances = self.covariances[keep]
+        self.ids = self.ids[keep]
+        self.hits = self.hits[keep]
+        self.misses = self.misses[keep]
+        self.class_votes = self.class_votes[keep]
+        self.counted = self.counted[keep]
+        self.centres = self.centres[keep]
+
+
+def check_fast_vehicles(steps=(10, 40, 80), samples=8, box=(40, 30)):
+    """
+    Track one vehicle that moves a fixed number of pixels between samples
+
+    Steps at or beyond the box width are what large frame intervals produce;
+    every step should count exactly one vehicle.
+
+    Returns:
+        dict: Step in pixels -> unique vehicles counted
+    """
+    counts = {}
+    for step in steps:
+        tracker = VehicleTracker()
+        for i in range(samples):
+            tracker.update([{"class": "car", "box": (i * step, 0, i * step + box[0], box[1])}])
+        counts[step] = sum(tracker.finish().values())
+    return counts
+
+
+if __name__ == "__main__":
+    counts = check_fast_vehicles()
+    for step, count in counts.items():
+        print(f"{step:>4} px per sample: {count} vehicle(s) counted")
+    raise SystemExit(0 if all(count == 1 for count in counts.values()) else 1)
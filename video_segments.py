@@ -0,0 +1,261 @@
+# Splitting long recordings into segments that are processed in parallel worker processes
+import json
+import os
+import shutil
+import subprocess
+import time
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from vehicle_tracker import VehicleTracker, iou_matrix
+
+cv2 = lazy_import("cv2")
+
+# Detector owned by this worker process, built once by init_worker
+_detector = None
+
+
+def find_keyframes(video_path):
+    """
+    Frame indices of the video's keyframes, read from the container with ffprobe
+
+    Only packet flags are read, so nothing is decoded.
+
+    Returns:
+        list: Keyframe indices, or None when ffprobe isn't installed or fails
+    """
+    if shutil.which("ffprobe") is None:
+        return None
+
+    try:
+        output = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "v:0",
+             "-show_entries", "packet=flags", "-of", "csv=p=0", video_path],
+            capture_output=True, text=True, check=True, timeout=600).stdout
+    except (subprocess.SubprocessError, OSError):
+        return None
+
+    return [index for index, flags in enumerate(output.split()) if "K" in flags]
+
+
+def plan_segments(total_frames, count, keyframes=None):
+    """
+    Split a video into roughly equal segments, starting each one on a keyframe
+
+    Seeking to a keyframe means a worker doesn't decode frames before its
+    segment just to reach its first frame.
+
+    Args:
+        total_frames (int): Frame count reported by the container
+        count (int): Number of segments wanted
+        keyframes (list): Keyframe indices (None splits evenly)
+
+    Returns:
+        list: (index, start frame, end frame) tuples; the last segment's end is
+            None and it runs to the end of the stream
+    """
+    bounds = {0}
+    for i in range(1, max(count, 1)):
+        target = round(i * total_frames / count)
+        if keyframes:
+            target = min(keyframes, key=lambda frame: abs(frame - target))
+        if 0 < target < total_frames:
+            bounds.add(target)
+
+    starts = sorted(bounds)
+    ends = starts[1:] + [None]
+    return [(index, start, end) for index, (start, end) in enumerate(zip(starts, ends))]
+
+
+class SegmentLog:
+    """
+    NDJSON record of a segmented run: one header line, then one line per finished segment
+
+    Each line is flushed as soon as its segment finishes, so an interrupted
+    run can pick up where it stopped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def open(self, header):
+        """
+        Open the log, keeping finished segments of an earlier run of the same job
+
+        Args:
+            header (dict): Describes the job (video, sampling and segment plan)
+
+        Returns:
+            dict: Segment index -> result of each segment that was already finished
+
+        Raises:
+            ValueError: If the log belongs to a different job
+        """
+        completed = {}
+        valid_bytes = 0
+
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                lines = f.readlines()
+            for number, line in enumerate(lines):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A partly written last line from an interrupted run
+                    break
+                if number == 0:
+                    if record != header:
+                        raise ValueError(f"{self.path} was written for a different video or settings; "
+                                         "remove it or use another segment log")
+                else:
+                    completed[record["segment"]] = record
+                valid_bytes += len(line)
+
+        self.file = open(self.path, "ab")
+        self.file.truncate(valid_bytes)
+        if not valid_bytes:
+            self.append(header)
+        return completed
+
+    def append(self, record):
+        """Write one line and make sure it reaches the disk"""
+        self.file.write(json.dumps(record).encode() + b"\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def init_worker(config):
+    """Build this worker process's own detector (called once per process)"""
+    global _detector
+    from vehicle_detector import VehicleDetector
+    _detector = VehicleDetector(**config)
+
+
+def process_segment(video_path, segment, frame_interval, lane=None, roi=None, track=False, count_line=None):
+    """
+    Count vehicles in one segment of a video (runs in a worker process)
+
+    Frames are sampled by their position in the whole video, so the sampled
+    frames are the same as in a single-process run.
+
+    Args:
+        video_path (str): Path to video file
+        segment (tuple): (index, start frame, end frame or None)
+        frame_interval (int): Process every nth frame
+        lane (str): Lane key for motion gating
+        roi: Region of interest applied to every sampled frame
+        track (bool): Track vehicles within the segment
+        count_line (tuple): Counting line passed to the tracker
+
+    Returns:
+        dict: Per-frame counts, plus the segment's unique counts and boundary
+            tracks when tracking
+    """
+    from vehicle_detector import VEHICLE_TYPES
+
+    index, start, end = segment
+    started = time.perf_counter()
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file {video_path}")
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    tracker = VehicleTracker(class_names=VEHICLE_TYPES, count_line=count_line) if track else None
+    frame_counts = []
+    head = None
+    position = start
+
+    try:
+        while end is None or position < end:
+            # Skipped frames are only grabbed, not decoded
+            if not cap.grab():
+                break
+            position += 1
+            if position % frame_interval != 0:
+                continue
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+
+            frame_vehicles, detections = _detector._infer(frame, lane, roi=roi)
+            frame_counts.append(frame_vehicles)
+
+            if tracker is not None:
+                track_ids = tracker.update(detections)
+                if head is None:
+                    # Tracks of the first sampled frame, to match against the previous segment
+                    head = [{"id": track_id, "box": box}
+                            for track_id, box in zip(track_ids, detections.boxes.tolist())]
+    finally:
+        cap.release()
+
+    result = {
+        "segment": index,
+        "start": start,
+        "end": position,
+        "frame_counts": frame_counts,
+        "elapsed": round(time.perf_counter() - started, 3)
+    }
+    if tracker is not None:
+        result["tail"] = tracker.boundary_tracks()
+        result["unique_by_type"] = tracker.finish()
+        result["head"] = head or []
+        # JSON object keys are strings
+        result["counted"] = {str(track_id): name for track_id, name in tracker.counted_types.items()}
+    return result
+
+
+def stitch_tracks(results, iou_threshold=0.3):
+    """
+    Add up unique counts of consecutive segments without counting boundary vehicles twice
+
+    Tracks alive at the end of a segment are matched by IoU with the tracks
+    in the first sampled frame of the next one. A matched pair that was
+    counted in both segments is the same vehicle, so one count is removed.
+
+    Args:
+        results (list): process_segment results in segment order
+        iou_threshold (float): Minimum IoU between a predicted and a detected box
+
+    Returns:
+        tuple: (unique counts by type, vehicles counted twice and removed)
+    """
+    unique_by_type = {}
+    for result in results:
+        for name, count in result["unique_by_type"].items():
+            unique_by_type[name] = unique_by_type.get(name, 0) + count
+
+    duplicates = 0
+    for previous, current in zip(results, results[1:]):
+        if not previous["tail"] or not current["head"]:
+            continue
+
+        ious = iou_matrix(np.array([t["box"] for t in previous["tail"]], dtype=np.float64),
+                          np.array([t["box"] for t in current["head"]], dtype=np.float64))
+
+        # Greedy matching from the best overlap down, like the tracker itself
+        tail_rows, head_rows = np.nonzero(ious >= iou_threshold)
+        order = np.argsort(-ious[tail_rows, head_rows], kind="stable")
+        used_tail, used_head = set(), set()
+        for tail_row, head_row in zip(tail_rows[order], head_rows[order]):
+            if tail_row in used_tail or head_row in used_head:
+                continue
+            used_tail.add(tail_row)
+            used_head.add(head_row)
+
+            tail_type = previous["counted"].get(str(previous["tail"][tail_row]["id"]))
+            head_type = current["counted"].get(str(current["head"][head_row]["id"]))
+            if tail_type and head_type:
+                unique_by_type[head_type] -= 1
+                duplicates += 1
+
+    return unique_by_type, duplicates